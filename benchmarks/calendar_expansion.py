@@ -0,0 +1,70 @@
+"""
+Час розгортання повторюваних задач у входження (`recurrence.occurrences`), яке
+виконують `/calendar` та збирання порядків денних.
+
+База даних не потрібна: скрипт генерує синтетичні задачі з різними repeat_days,
+часом початку та важливістю і вимірює розгортання одного вікна кілька разів.
+Для порівняння "до/після" запускайте його на обох версіях коду з однаковими параметрами.
+
+Приклад:
+    python -m benchmarks.calendar_expansion --tasks 3000 --days 31 --runs 20
+"""
+import argparse
+import json
+import random
+import statistics
+import time
+from datetime import date, timedelta
+
+import recurrence
+
+_REPEAT_DAYS = (["1", "3", "5"], ["2", "4"], ["1", "2", "3", "4", "5"], ["6", "7"], ["Monday", "Thursday"], [])
+
+
+def make_tasks(count, window_start, seed=0):
+    rng = random.Random(seed)
+    tasks = []
+    for n in range(count):
+        start = window_start - timedelta(days=rng.randint(0, 60))
+        tasks.append({
+            "_id": f"{n:024x}",
+            "title": f"Task {n}", "group": f"Group {n % 50}", "importance": rng.randint(0, 2),
+            "start_date": start.isoformat(), "end_date": (start + timedelta(days=rng.randint(30, 365))).isoformat(),
+            "start_time": f"{rng.randint(6, 20):02d}:{rng.choice((0, 15, 30, 45)):02d}", "end_time": "21:00",
+            "repeat_days": _REPEAT_DAYS[n % len(_REPEAT_DAYS)],
+        })
+    return tasks
+
+
+def run(count, days, runs):
+    window_start = date(2025, 3, 1)
+    window_end = window_start + timedelta(days=days - 1)
+    tasks = make_tasks(count, window_start)
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        result = recurrence.occurrences(tasks, window_start, window_end)
+        timings.append(time.perf_counter() - started)
+    timings.sort()
+    return {
+        "tasks": count,
+        "days": days,
+        "occurrences": len(result),
+        "runs": runs,
+        "median_ms": round(statistics.median(timings) * 1000, 2),
+        "p95_ms": round(timings[min(len(timings) - 1, int(round(0.95 * (len(timings) - 1))))] * 1000, 2),
+        "min_ms": round(timings[0] * 1000, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tasks", type=int, default=3000)
+    parser.add_argument("--days", type=int, default=31)
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+    print(json.dumps(run(args.tasks, args.days, args.runs), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Порівняння швидкості запису виконань: окремий `insert_one` на кожен запит
+проти write-behind буфера (`db/write_behind.py`) з груповим `insert_many`.
+
+Запускається проти локального mongod у окремій базі (за замовчуванням `taskmanager_bench`).
+
+Приклад:
+    python -m benchmarks.completion_inserts --mongo mongodb://localhost:27017 \
+        --writers 200 --inserts 20000 --batch-size 200 --delay-ms 20
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from db.write_behind import GroupCommitBuffer
+
+
+def _doc(n):
+    return {"id_task": f"task-{n % 100}", "key_time": f"key-{n % 1000}", "phone": "+380000000001",
+            "start_time": "09:00", "finish_time": "10:00", "pause_start": [], "pause_end": [],
+            "comment": None, "status": 1}
+
+
+async def _run(insert, writers, total):
+    counter = iter(range(total))
+
+    async def writer():
+        for n in counter:
+            await insert(_doc(n))
+
+    started = time.perf_counter()
+    await asyncio.gather(*[writer() for _ in range(writers)])
+    elapsed = time.perf_counter() - started
+    return {"elapsed_s": round(elapsed, 3), "inserts_per_s": round(total / elapsed, 1)}
+
+
+async def main(args):
+    collection = AsyncIOMotorClient(args.mongo)[args.database]["CompletedTaskBench"]
+
+    await collection.drop()
+    direct = await _run(collection.insert_one, args.writers, args.inserts)
+
+    await collection.drop()
+    buffer = GroupCommitBuffer(collection, max_batch=args.batch_size, max_delay=args.delay_ms / 1000)
+    buffered = await _run(buffer.insert, args.writers, args.inserts)
+    await buffer.close()
+
+    print(json.dumps({
+        "writers": args.writers,
+        "inserts": args.inserts,
+        "insert_one": direct,
+        "write_behind": {**buffered, "batch_size": args.batch_size, "delay_ms": args.delay_ms},
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mongo", default="mongodb://localhost:27017")
+    parser.add_argument("--database", default="taskmanager_bench")
+    parser.add_argument("--writers", type=int, default=200)
+    parser.add_argument("--inserts", type=int, default=20_000)
+    parser.add_argument("--batch-size", type=int, default=200)
+    parser.add_argument("--delay-ms", type=int, default=20)
+    asyncio.run(main(parser.parse_args()))
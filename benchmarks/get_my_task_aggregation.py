@@ -0,0 +1,101 @@
+"""
+Порівняння затримки `/get_my_task` (три послідовні запити) та `/v2/get_my_task`
+(один агрегаційний запит) на синтетичних даних.
+
+Скрипт заповнює окрему базу (за замовчуванням `taskmanager_bench`) на локальному
+mongod: 1000 груп користувача, задачі в кожній групі та 100 000 виконань.
+
+Приклад:
+    python -m benchmarks.get_my_task_aggregation --mongo mongodb://localhost:27017 \
+        --groups 1000 --tasks-per-group 5 --completions 100000 --runs 20
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from db.indexes import INDEXES
+from db.queries import my_tasks_pipeline
+
+PHONE = "+380000000001"
+
+
+async def seed(db, n_groups, tasks_per_group, n_completions):
+    for name in ("AllGroups", "Tasks", "CompletedTask"):
+        await db[name].drop()
+    await db.AllGroups.insert_many([
+        {"group_name": f"group-{g}", "manager_phone": "+380000000000", "user_phones": [PHONE], "active": 1}
+        for g in range(n_groups)
+    ])
+    result = await db.Tasks.insert_many([
+        {"title": f"task-{g}-{t}", "group": f"group-{g}", "importance": t % 3, "created_by": "+380000000000"}
+        for g in range(n_groups) for t in range(tasks_per_group)
+    ])
+    task_ids = [str(i) for i in result.inserted_ids]
+    batch = []
+    for c in range(n_completions):
+        batch.append({"id_task": task_ids[c % len(task_ids)], "key_time": f"k-{c}", "phone": PHONE, "status": 1})
+        if len(batch) == 10_000:
+            await db.CompletedTask.insert_many(batch, ordered=False)
+            batch = []
+    if batch:
+        await db.CompletedTask.insert_many(batch, ordered=False)
+    # Ті самі індекси, що й у робочій базі
+    for collection, models in INDEXES:
+        await db[collection.name].create_indexes(models)
+
+
+async def legacy(db):
+    # Логіка `/get_my_task`
+    r = db.AllGroups.find({'user_phones': PHONE, 'active': 1}, {"group_name": 1, "_id": 0})
+    compltasks = db.CompletedTask.find({"phone": PHONE}, {"key_time": 1, "_id": 0})
+    tasks_complete = [i['key_time'] async for i in compltasks]
+    groups_name = [i["group_name"] async for i in r]
+    user_tasks = await db.Tasks.find({'group': {'$in': groups_name}}).sort([('importance', -1)]).to_list(length=None)
+    for task in user_tasks:
+        task["_id"] = str(task["_id"])
+    user_tasks.append(tasks_complete)
+    return user_tasks
+
+
+async def aggregated(db):
+    # Логіка `/v2/get_my_task`
+    return await db.AllGroups.aggregate(my_tasks_pipeline(PHONE)).to_list(length=None)
+
+
+async def measure(func, db, runs):
+    await func(db)  # прогрів
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        await func(db)
+        timings.append((time.perf_counter() - started) * 1000)
+    return {"p50_ms": round(statistics.median(timings), 2), "max_ms": round(max(timings), 2)}
+
+
+async def main(args):
+    db = AsyncIOMotorClient(args.mongo)[args.database]
+    if not args.skip_seed:
+        await seed(db, args.groups, args.tasks_per_group, args.completions)
+    print(json.dumps({
+        "groups": args.groups,
+        "tasks": args.groups * args.tasks_per_group,
+        "completions": args.completions,
+        "v1_get_my_task": await measure(legacy, db, args.runs),
+        "v2_get_my_task": await measure(aggregated, db, args.runs),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mongo", default="mongodb://localhost:27017")
+    parser.add_argument("--database", default="taskmanager_bench")
+    parser.add_argument("--groups", type=int, default=1000)
+    parser.add_argument("--tasks-per-group", type=int, default=5)
+    parser.add_argument("--completions", type=int, default=100_000)
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--skip-seed", action="store_true", help="використати вже заповнену базу")
+    asyncio.run(main(parser.parse_args()))
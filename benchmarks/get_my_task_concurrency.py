@@ -0,0 +1,41 @@
+"""
+Бенчмарк пропускної здатності `/get_my_task` при паралельних клієнтах.
+
+Запускається проти працюючого сервера (uvicorn main:app) з реальною MongoDB.
+Щоб порівняти "до" і "після", запустіть скрипт на обох версіях коду з однаковими
+параметрами та однаковими даними в базі.
+
+Приклад:
+    python -m benchmarks.get_my_task_concurrency --url http://127.0.0.1:8000 \
+        --token <jwt> --clients 50 --requests 2000
+"""
+import argparse
+import asyncio
+import json
+
+import httpx
+
+from benchmarks.suite import LATENCY_KEYS, run_scenario
+
+
+async def run(base_url, token, clients, total):
+    headers = {"Authorization": f"Bearer {token}"}
+    limits = httpx.Limits(max_connections=clients, max_keepalive_connections=clients)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as http:
+        result = await run_scenario(http, [("GET", "/get_my_task", None, headers)] * total, clients)
+    return {"endpoint": "/get_my_task", "clients": clients, **{key: result[key] for key in LATENCY_KEYS}}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--token", required=True, help="JWT користувача, який має групи та задачі")
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+    result = asyncio.run(run(args.url.rstrip("/"), args.token, args.clients, args.requests))
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
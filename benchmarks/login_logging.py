@@ -0,0 +1,65 @@
+"""
+Бенчмарк затримки `/login` з увімкненим і вимкненим логуванням.
+
+Запускається проти працюючого сервера (uvicorn main:app) з реальною MongoDB. Кожен
+успішний вхід пише запис рівня INFO, тож порівнюються два запуски сервера:
+
+    LOG_LEVEL=INFO uvicorn main:app       # логування увімкнено
+    LOG_LEVEL=WARNING uvicorn main:app    # записи входу не пишуться
+
+Для кожного запуску збережіть результат і порівняйте p99:
+
+    python -m benchmarks.login_logging --phone +380987654321 --password secret --label on > on.json
+    python -m benchmarks.login_logging --phone +380987654321 --password secret --label off > off.json
+    python -m benchmarks.login_logging --compare on.json off.json
+
+Пул bcrypt обмежує пропускну здатність `/login`, тому кількість клієнтів варто тримати
+в межах HASH_QUEUE_LIMIT, інакше частина запитів отримає 503.
+"""
+import argparse
+import asyncio
+import json
+
+import httpx
+
+from benchmarks.suite import LATENCY_KEYS, run_scenario
+
+
+async def run(base_url, phone, password, clients, total, label):
+    body = {"phone": phone, "password": password}
+    limits = httpx.Limits(max_connections=clients, max_keepalive_connections=clients)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as http:
+        result = await run_scenario(http, [("POST", "/login", body, {})] * total, clients)
+    return {"endpoint": "/login", "label": label, "clients": clients, **{key: result[key] for key in LATENCY_KEYS}}
+
+
+def compare(first, second):
+    a, b = (json.load(open(path)) for path in (first, second))
+    return {
+        key: {a["label"]: a[key], b["label"]: b[key], "diff": round(a[key] - b[key], 2)}
+        for key in ("throughput_rps", "p50_ms", "p95_ms", "p99_ms")
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--phone")
+    parser.add_argument("--password")
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--label", default="run")
+    parser.add_argument("--compare", nargs=2, metavar=("FIRST", "SECOND"), help="порівняти два збережені результати")
+    args = parser.parse_args()
+    if args.compare:
+        print(json.dumps(compare(*args.compare), indent=2))
+        return
+    if not args.phone or not args.password:
+        parser.error("--phone and --password are required")
+    result = asyncio.run(run(args.url.rstrip("/"), args.phone, args.password,
+                             args.clients, args.requests, args.label))
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,258 @@
+"""
+Набір навантажувальних сценаріїв проти локального mongod.
+
+Скрипт заповнює базу тестовими даними і запускає ASGI-застосунок у тому ж процесі
+(httpx.ASGITransport, без мережі й uvicorn), тож результати не залежать від
+налаштувань веб-сервера, а RSS вимірюється для процесу із застосунком. Сценарії:
+
+- login_storm: паралельні `/login` різних користувачів (bcrypt);
+- get_my_task_polling: опитування `/get_my_task` учасниками груп;
+- completion_burst: сплеск `/push_task` з унікальними `keyTime`;
+- admin_listing: сторінки `/get_users` та `/get_groups/` адміністратором.
+
+Для кожного сценарію виводяться throughput, p50/p95/p99, кількість помилок і RSS.
+Застосунок працює з окремою базою `--database` (за замовчуванням `taskmanager_bench`,
+передається в db/dbconn.py через MONGO_DB). Колекції цієї бази очищуються, тому
+база застосунку (`azubi_wohnen`) заборонена, а за замовчуванням дозволені лише
+адреси localhost.
+
+Приклад:
+    python -m benchmarks.suite --mongo mongodb://localhost:27017 --concurrency 50 --output results.json
+    python -m benchmarks.suite --mongo mongodb://localhost:27017 --compare baseline.json --threshold 0.15
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+from urllib.parse import urlparse
+
+import httpx
+import psutil
+
+SCENARIOS = ("login_storm", "get_my_task_polling", "completion_burst", "admin_listing")
+# Показники, зростання яких (як і падіння throughput) вважається регресією
+COMPARED = ("p95_ms", "p99_ms")
+# Fields of a run_scenario result that do not depend on this process; the scripts
+# that benchmark a separately started server report only these
+LATENCY_KEYS = ("requests", "errors", "elapsed_s", "throughput_rps", "p50_ms", "p95_ms", "p99_ms")
+
+PASSWORD = "benchmark-password"
+_process = psutil.Process()
+
+
+def _phone(n):
+    return f"+38090{n:07d}"
+
+
+def _percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def seed(database, users_count, groups_count, tasks_per_group):
+    # Порожні колекції з детермінованими даними; повертає телефони учасників груп
+    from db.dbconn import APP_DATABASE, users, users_collections, groups, tasks, completedtasks, deletedtasks, \
+        taskcounters, agendas
+    from db.hash import Hash
+
+    # Остання перевірка перед очищенням: застосунок має бути підключений саме до бази бенчмарку
+    if users.name != database or users.name == APP_DATABASE:
+        raise RuntimeError(f"refusing to wipe database {users.name!r}")
+    for collection in (users_collections, groups, tasks, completedtasks, deletedtasks, taskcounters, agendas):
+        await collection.delete_many({})
+
+    # Один хеш для всіх: заповнення не повинне займати хвилини на bcrypt
+    hashed = Hash.bcrypt(PASSWORD)
+    managers = [_phone(n) for n in range(groups_count)]
+    members = [_phone(n) for n in range(groups_count, users_count)]
+    await users_collections.insert_many(
+        [{"name": f"Manager {n}", "phone": phone, "password": hashed, "status": "add"} for n, phone in enumerate(managers)]
+        + [{"name": f"User {n}", "phone": phone, "password": hashed, "status": "receive"} for n, phone in enumerate(members)])
+
+    group_docs = []
+    for n, manager in enumerate(managers):
+        group_docs.append({
+            "group_name": f"Group {n}",
+            "manager_phone": manager,
+            "user_phones": members[n::groups_count],
+            "active": 1,
+        })
+    await groups.insert_many(group_docs)
+
+    task_docs = []
+    for n, group in enumerate(group_docs):
+        for t in range(tasks_per_group):
+            task_docs.append({
+                "title": f"Task {t}", "description": "Benchmark task",
+                "start_date": "2025-01-01", "end_date": "2025-12-31",
+                "start_time": f"{8 + t % 10:02d}:00", "end_time": f"{9 + t % 10:02d}:00",
+                "repeat_days": ["1", "3", "5"], "group": group["group_name"], "task_type": "regular",
+                "importance": t % 3, "created_by": group["manager_phone"], "needphoto": 0, "needcomment": 0,
+                "created_name": f"Manager {n}",
+            })
+    if task_docs:
+        await tasks.insert_many(task_docs)
+    task_ids = [str(i["_id"]) async for i in tasks.find({}, {"_id": 1}).limit(1000)]
+    return members, task_ids
+
+
+def _token(phone, user_status):
+    from jose import jwt
+    from middelware.auth import SECRET_JWT
+    return jwt.encode({"sub": phone, "status": user_status, "exp": int(time.time()) + 24 * 3600}, SECRET_JWT, algorithm="HS256")
+
+
+def _requests(scenario, members, task_ids, total):
+    # (метод, шлях, json, заголовки) для кожного запиту сценарію
+    admin = {"Authorization": f"Bearer {_token('+380000000000', 'admin')}"}
+    if scenario == "login_storm":
+        return [("POST", "/login", {"phone": members[n % len(members)], "password": PASSWORD}, {}) for n in range(total)]
+    if scenario == "get_my_task_polling":
+        headers = [{"Authorization": f"Bearer {_token(phone, 'receive')}"} for phone in members[:200]]
+        return [("GET", "/get_my_task", None, headers[n % len(headers)]) for n in range(total)]
+    if scenario == "completion_burst":
+        headers = [{"Authorization": f"Bearer {_token(phone, 'receive')}"} for phone in members[:200]]
+        started = int(time.time())
+        return [("POST", "/push_task", {
+            "start_time": "09:00", "finish_time": "10:00", "pause_start": [], "pause_end": [],
+            "id_task": task_ids[n % len(task_ids)],
+            "keyTime": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(started + n)), "comment": None,
+        }, headers[n % len(headers)]) for n in range(total)]
+    if scenario == "admin_listing":
+        paths = ["/get_users?limit=100", "/get_groups/?limit=100", "/get_users_add?limit=100"]
+        return [("GET", paths[n % len(paths)], None, admin) for n in range(total)]
+    raise ValueError(scenario)
+
+
+async def _sample_rss(peak):
+    while True:
+        peak[0] = max(peak[0], _process.memory_info().rss)
+        await asyncio.sleep(0.05)
+
+
+async def run_scenario(http, requests, concurrency):
+    queue = asyncio.Queue()
+    for request in requests:
+        queue.put_nowait(request)
+    latencies, errors = [], []
+
+    async def client():
+        while True:
+            try:
+                method, path, body, headers = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            started = time.perf_counter()
+            try:
+                response = await http.request(method, path, json=body, headers=headers)
+                if response.status_code != 200:
+                    errors.append(response.status_code)
+            except httpx.HTTPError as e:
+                errors.append(type(e).__name__)
+            latencies.append(time.perf_counter() - started)
+
+    peak = [_process.memory_info().rss]
+    sampler = asyncio.get_running_loop().create_task(_sample_rss(peak))
+    started = time.perf_counter()
+    await asyncio.gather(*[client() for _ in range(concurrency)])
+    elapsed = time.perf_counter() - started
+    sampler.cancel()
+    return {
+        "requests": len(requests),
+        "concurrency": concurrency,
+        "errors": len(errors),
+        "error_codes": sorted({str(e) for e in errors}),
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(requests) / elapsed, 1),
+        "p50_ms": round(statistics.median(latencies) * 1000, 2),
+        "p95_ms": round(_percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(_percentile(latencies, 99) * 1000, 2),
+        "rss_mib": round(_process.memory_info().rss / (1024 * 1024), 1),
+        "rss_peak_mib": round(peak[0] / (1024 * 1024), 1),
+    }
+
+
+async def run(args):
+    import main
+
+    members, task_ids = await seed(args.database, args.users, args.groups, args.tasks_per_group)
+    await main.startup_event()
+    results = {"settings": {"users": args.users, "groups": args.groups, "tasks_per_group": args.tasks_per_group,
+                            "concurrency": args.concurrency}, "scenarios": {}}
+    try:
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as http:
+            for scenario in args.scenarios:
+                total = args.login_requests if scenario == "login_storm" else args.requests
+                requests = _requests(scenario, members, task_ids, total)
+                results["scenarios"][scenario] = await run_scenario(http, requests, args.concurrency)
+                print(scenario, json.dumps(results["scenarios"][scenario]), file=sys.stderr)
+    finally:
+        await main.shutdown_event()
+    return results
+
+
+def compare(results, baseline, threshold):
+    # Регресії: p95/p99 зросли або throughput впав більше ніж на threshold
+    regressions = []
+    for scenario, current in results["scenarios"].items():
+        before = baseline.get("scenarios", {}).get(scenario)
+        if before is None:
+            continue
+        for key in COMPARED:
+            if before[key] and current[key] > before[key] * (1 + threshold):
+                regressions.append({"scenario": scenario, "metric": key, "baseline": before[key], "current": current[key]})
+        if current["throughput_rps"] < before["throughput_rps"] * (1 - threshold):
+            regressions.append({"scenario": scenario, "metric": "throughput_rps",
+                                "baseline": before["throughput_rps"], "current": current["throughput_rps"]})
+    return regressions
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mongo", default="mongodb://localhost:27017")
+    parser.add_argument("--database", default="taskmanager_bench", help="окрема база, яку буде очищено")
+    parser.add_argument("--allow-remote", action="store_true", help="дозволити не-localhost mongod (дані буде очищено!)")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--login-requests", type=int, default=200, help="login_storm обмежений bcrypt, тому запитів менше")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--groups", type=int, default=20)
+    parser.add_argument("--tasks-per-group", type=int, default=50)
+    parser.add_argument("--output", help="зберегти результати в JSON-файл")
+    parser.add_argument("--compare", metavar="BASELINE", help="порівняти з попередньо збереженими результатами")
+    parser.add_argument("--threshold", type=float, default=0.1, help="допустиме погіршення, частка (0.1 = 10%%)")
+    args = parser.parse_args()
+
+    if urlparse(args.mongo).hostname not in ("localhost", "127.0.0.1", "::1") and not args.allow_remote:
+        parser.error("the suite wipes the collections it seeds; use a local mongod or pass --allow-remote")
+    if args.database == "azubi_wohnen":
+        parser.error("the suite wipes --database; use a separate benchmark database, not the application one")
+
+    # Налаштування читаються при імпорті застосунку, тому задаються до нього
+    os.environ["MONGO_URL"] = args.mongo
+    os.environ["MONGO_DB"] = args.database
+    os.environ.setdefault("SecretJwt", "benchmark-secret")
+    # Обмеження черги bcrypt відхиляло б частину login_storm з 503
+    os.environ.setdefault("HASH_QUEUE_LIMIT", str(max(64, args.concurrency)))
+
+    results = asyncio.run(run(args))
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        print(json.dumps({"regressions": regressions}, indent=2))
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,139 @@
+"""
+Per-user daily agenda materialization.
+
+`Agendas` holds one document per (phone, day) with the occurrences of that
+day already expanded and the user's completion state filled in, so `/agenda`
+is answered with one `_id` lookup. Documents are built on first read and then
+kept current incrementally:
+
+- a new task is pushed into the existing agendas of its group members;
+- an edited task drops the agendas that contain it (they are rebuilt on the
+  next read) and is pushed into the members' other agendas;
+- a deleted task is pulled from every agenda;
+- a completion sets the status of its item in place.
+
+Each agenda remembers the user's active groups it was built for; when the
+membership changes, the agenda is rebuilt on the next read. Only days in
+`[today - AGENDA_PAST_DAYS, today + AGENDA_FUTURE_DAYS]` are stored, other
+days are computed on request.
+"""
+import hashlib
+import os
+from datetime import date, datetime, time, timedelta, timezone
+
+from pymongo import UpdateMany, UpdateOne
+
+import recurrence
+from db.dbconn import tasks, completedtasks, agendas
+from db.membership_cache import groups_of, group_info
+
+AGENDA_PAST_DAYS = int(os.getenv("AGENDA_PAST_DAYS", 7))
+AGENDA_FUTURE_DAYS = int(os.getenv("AGENDA_FUTURE_DAYS", 60))
+
+_TASK_PROJECTION = {"title": 1, "group": 1, "importance": 1, "start_date": 1, "end_date": 1,
+                    "start_time": 1, "end_time": 1, "repeat_days": 1}
+_ITEMS_SORT = {"start_time": 1, "importance": -1}
+
+
+def _window():
+    today = date.today()
+    return today - timedelta(days=AGENDA_PAST_DAYS), today + timedelta(days=AGENDA_FUTURE_DAYS)
+
+
+def _agenda_id(phone, day):
+    return f"{phone}|{day.isoformat()}"
+
+
+def _digest(group_names):
+    return hashlib.sha1("\n".join(sorted(group_names)).encode()).hexdigest()
+
+
+def _items(day_tasks, first_day, last_day):
+    # Occurrences grouped by day, without the per-day "date" field
+    by_day = recurrence.occurrences_by_day(day_tasks, first_day, last_day)
+    for items in by_day.values():
+        for item in items:
+            item["status"] = None
+    return by_day
+
+
+async def _build(phone, day, group_names):
+    start, end = datetime.combine(day, time.min), datetime.combine(day, time.max)
+    day_tasks = await tasks.find({
+        "group": {"$in": group_names},
+        "$or": [
+            {"starts_at": {"$lte": end}, "ends_at": {"$gte": start}},
+            {"starts_at": {"$exists": False}, "start_date": {"$lte": day.isoformat()}},
+        ],
+    }, _TASK_PROJECTION).to_list(length=None)
+    items = _items(day_tasks, day, day).get(day.isoformat(), [])
+    if items:
+        done = {}
+        async for i in completedtasks.find(
+                {"phone": phone, "key_time": {"$in": list({item["key_time"] for item in items})}},
+                {"_id": 0, "id_task": 1, "key_time": 1, "status": 1}):
+            done[(i.get("id_task"), i["key_time"])] = i.get("status")
+        for item in items:
+            item["status"] = done.get((item["task_id"], item["key_time"]))
+    return items
+
+
+async def agenda_for(phone, day):
+    # Items of the user's agenda for `day`
+    group_names = await groups_of(phone)
+    first, last = _window()
+    if not first <= day <= last:
+        return await _build(phone, day, group_names)
+
+    digest = _digest(group_names)
+    doc = await agendas.find_one({"_id": _agenda_id(phone, day)}, {"items": 1, "groups_digest": 1})
+    if doc is not None and doc["groups_digest"] == digest:
+        return doc["items"]
+
+    items = await _build(phone, day, group_names)
+    await agendas.replace_one({"_id": _agenda_id(phone, day)}, {
+        "phone": phone,
+        "date": day.isoformat(),
+        "groups_digest": digest,
+        "items": items,
+        "built_at": datetime.now(timezone.utc),
+    }, upsert=True)
+    return items
+
+
+async def task_created(task):
+    # Push the occurrences of a new task into its members' existing agendas
+    info = await group_info(task["group"])
+    # Agendas only show tasks of active groups
+    if not info or info.get("active") != 1 or not info.get("user_phones"):
+        return
+    first, last = _window()
+    ops = [
+        UpdateMany({"phone": {"$in": info["user_phones"]}, "date": day},
+                   {"$push": {"items": {"$each": items, "$sort": _ITEMS_SORT}}})
+        for day, items in _items([task], first, last).items()
+    ]
+    if ops:
+        await agendas.bulk_write(ops, ordered=False)
+
+
+async def task_updated(task):
+    # Agendas that show the old version are rebuilt on the next read
+    await agendas.delete_many({"items.task_id": str(task["_id"])})
+    await task_created(task)
+
+
+async def task_deleted(task_id):
+    await agendas.update_many({"items.task_id": task_id}, {"$pull": {"items": {"task_id": task_id}}})
+
+
+async def completions_recorded(docs):
+    # Set the status of the completed occurrences in place
+    ops = [
+        UpdateOne({"_id": f'{doc["phone"]}|{doc["key_time"][:10]}'},
+                  {"$set": {"items.$[item].status": doc["status"]}},
+                  array_filters=[{"item.task_id": doc["id_task"], "item.key_time": doc["key_time"]}])
+        for doc in docs
+    ]
+    if ops:
+        await agendas.bulk_write(ops, ordered=False)
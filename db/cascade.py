@@ -0,0 +1,259 @@
+"""
+Cascade deletes for users and groups.
+
+Deleting a user removes the user, the groups they manage, their membership in
+other groups, their completions and agendas, and the tasks of the managed
+groups together with the completions of those tasks. Deleting a group removes
+the group, its tasks and their completions. Completion counters are decreased
+by the completions that are removed.
+
+The deletes run as one unit: inside a transaction when the server supports
+them (replica set or sharded cluster), otherwise as a short sequence of bulk
+writes. When the tasks and completions to delete number more than
+`CASCADE_INLINE_LIMIT`, only the user/group documents, memberships and
+agendas are removed in the request; the ids of the tasks are recorded in
+`CascadeJobs` and a background job deletes them, their completions and the
+user's completions in chunks of `CASCADE_CHUNK_SIZE`. The job only touches
+what existed when it was created, so a group or user recreated under the same
+name or phone keeps its new tasks and completions.
+
+Jobs are idempotent. Jobs interrupted by a restart are resumed by the startup
+hook once they have not made progress for `CASCADE_RESUME_AFTER` seconds, and
+running jobs are cancelled on shutdown. Failed jobs, and interrupted ones
+without waiting for a restart, are retried with:
+
+    python -m db.cascade
+
+Both claim a job before running it, so a job is never run by two workers.
+"""
+import asyncio
+import os
+import uuid
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+
+from bson import ObjectId
+
+from db.counters import uncount_completions
+from db.dbconn import client, users, users_collections, groups, tasks, completedtasks, agendas
+from logger import logger
+
+CASCADE_INLINE_LIMIT = int(os.getenv("CASCADE_INLINE_LIMIT", 1000))
+CASCADE_CHUNK_SIZE = int(os.getenv("CASCADE_CHUNK_SIZE", 500))
+# A running job that has not updated its progress for this long is considered interrupted
+CASCADE_RESUME_AFTER = int(os.getenv("CASCADE_RESUME_AFTER", 60))
+
+cascadejobs = users.get_collection("CascadeJobs")
+
+_transactions = None
+# Running jobs; a reference is kept so they are not garbage collected
+_jobs = set()
+
+
+async def _transactions_supported():
+    global _transactions
+    if _transactions is None:
+        hello = await client.admin.command("hello")
+        _transactions = "setName" in hello or hello.get("msg") == "isdbgrid"
+    return _transactions
+
+
+@asynccontextmanager
+async def _unit():
+    # Session of a transaction, or None when the server can not run one
+    if not await _transactions_supported():
+        yield None
+        return
+    async with await client.start_session() as session:
+        async with session.start_transaction():
+            yield session
+
+
+async def _delete_tasks(task_ids, session=None):
+    # Tasks with these ids and their completions; returns (tasks, completions) deleted
+    if not task_ids:
+        return 0, 0
+    completions = {"id_task": {"$in": [str(i) for i in task_ids]}}
+    await uncount_completions(completions, session=session)
+    deleted_completions = await completedtasks.delete_many(completions, session=session)
+    deleted_tasks = await tasks.delete_many({"_id": {"$in": task_ids}}, session=session)
+    return deleted_tasks.deleted_count, deleted_completions.deleted_count
+
+
+async def _delete_completions(query, session=None):
+    await uncount_completions(query, session=session)
+    return (await completedtasks.delete_many(query, session=session)).deleted_count
+
+
+async def _cascade(kind, group_names, phone, session):
+    # Delete the tasks of the groups and the completions of `phone` now, or return the id of a job that will
+    task_ids = [i["_id"] async for i in tasks.find({"group": {"$in": group_names}}, {"_id": 1}, session=session)]
+    total = len(task_ids)
+    # Completions are deleted too, so they count towards the size of the unit
+    if total <= CASCADE_INLINE_LIMIT and task_ids:
+        total += await completedtasks.count_documents({"id_task": {"$in": [str(i) for i in task_ids]}}, session=session)
+    if total <= CASCADE_INLINE_LIMIT and phone:
+        total += await completedtasks.count_documents({"phone": phone}, session=session)
+    if total <= CASCADE_INLINE_LIMIT:
+        await _delete_tasks(task_ids, session=session)
+        if phone:
+            await _delete_completions({"phone": phone}, session=session)
+        return None
+    now = datetime.now(timezone.utc)
+    job_id = uuid.uuid4().hex
+    await cascadejobs.insert_one({
+        "_id": job_id, "kind": kind, "groups": group_names, "status": "running",
+        "task_ids": task_ids, "position": 0,
+        # Completions of a user registered again with this phone are newer than this id
+        "phone": phone, "completions_before": ObjectId() if phone else None,
+        "total_tasks": len(task_ids), "deleted_tasks": 0, "deleted_completions": 0,
+        "created_at": now, "updated_at": now,
+    }, session=session)
+    return job_id
+
+
+async def _progress(job_id, session, deleted_tasks=0, deleted_completions=0, **fields):
+    await cascadejobs.update_one({"_id": job_id}, {
+        "$inc": {"deleted_tasks": deleted_tasks, "deleted_completions": deleted_completions},
+        "$set": {"updated_at": datetime.now(timezone.utc), **fields},
+    }, session=session)
+
+
+async def run_job(job_id):
+    job = await cascadejobs.find_one({"_id": job_id})
+    task_ids = job["task_ids"]
+    try:
+        # `position` skips the chunks finished before an interruption
+        for start in range(job.get("position", 0), len(task_ids), CASCADE_CHUNK_SIZE):
+            chunk = task_ids[start:start + CASCADE_CHUNK_SIZE]
+            async with _unit() as session:
+                deleted_tasks, deleted_completions = await _delete_tasks(chunk, session=session)
+                await _progress(job_id, session, deleted_tasks, deleted_completions, position=start + len(chunk))
+        if job.get("phone"):
+            query = {"phone": job["phone"], "_id": {"$lt": job["completions_before"]}}
+            while True:
+                chunk = [i["_id"] async for i in completedtasks.find(query, {"_id": 1}).limit(CASCADE_CHUNK_SIZE)]
+                if not chunk:
+                    break
+                async with _unit() as session:
+                    deleted_completions = await _delete_completions({"_id": {"$in": chunk}}, session=session)
+                    await _progress(job_id, session, deleted_completions=deleted_completions)
+        await _progress(job_id, None, status="done")
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        logger.exception("Cascade job %s failed", job_id)
+        await _progress(job_id, None, status="failed", error=str(e))
+
+
+def _start(job_id):
+    if job_id is None:
+        return
+    job = asyncio.get_running_loop().create_task(run_job(job_id))
+    _jobs.add(job)
+    job.add_done_callback(_jobs.discard)
+
+
+async def _claim(include_failed=False, exclude=()):
+    # Id of a running job without recent progress (or of a failed one), or None.
+    # Claiming bumps updated_at, so other workers see the job as alive and skip it.
+    now = datetime.now(timezone.utc)
+    claimable = [{"status": "running", "updated_at": {"$lt": now - timedelta(seconds=CASCADE_RESUME_AFTER)}}]
+    if include_failed:
+        claimable.append({"status": "failed"})
+    job = await cascadejobs.find_one_and_update(
+        {"$or": claimable, "_id": {"$nin": list(exclude)}},
+        {"$set": {"status": "running", "updated_at": now}, "$unset": {"error": ""}}, {"_id": 1})
+    return job["_id"] if job else None
+
+
+async def _claim_interrupted():
+    while True:
+        job_id = await _claim()
+        if job_id is None:
+            return
+        logger.info("Resuming cascade job %s", job_id)
+        _start(job_id)
+
+
+async def _resume_interrupted():
+    await _claim_interrupted()
+    # Jobs interrupted just before this restart look alive until CASCADE_RESUME_AFTER passes
+    await asyncio.sleep(CASCADE_RESUME_AFTER)
+    await _claim_interrupted()
+
+
+def resume_jobs():
+    # Called from the startup hook
+    task = asyncio.get_running_loop().create_task(_resume_interrupted())
+    _jobs.add(task)
+    task.add_done_callback(_jobs.discard)
+
+
+async def stop_jobs():
+    # Called from the shutdown hook; an interrupted job is resumed from its last finished chunk
+    for job in list(_jobs):
+        job.cancel()
+    await asyncio.gather(*_jobs, return_exceptions=True)
+
+
+async def delete_user(user_id):
+    """
+    Deletes a user and everything that belongs to them.
+
+    Returns None if the user does not exist, otherwise a dict with the phones
+    whose membership changed (`phones`) and the id of the background job that
+    deletes the tasks and completions (`job_id`, None if they were deleted in
+    the request).
+    """
+    async with _unit() as session:
+        # The phone comes from the stored user, not from the request
+        user = await users_collections.find_one_and_delete({"_id": user_id}, {"phone": 1}, session=session)
+        if user is None:
+            return None
+        phone = user["phone"]
+        managed_groups = await groups.find({"manager_phone": phone}, {"_id": 0, "group_name": 1, "user_phones": 1},
+                                           session=session).to_list(length=None)
+        await groups.delete_many({"manager_phone": phone}, session=session)
+        await groups.update_many({"user_phones": phone}, {"$pull": {"user_phones": phone}}, session=session)
+        await agendas.delete_many({"phone": phone}, session=session)
+        job_id = await _cascade("delete_user", [i["group_name"] for i in managed_groups], phone, session)
+    _start(job_id)
+    return {"phones": [phone] + [p for i in managed_groups for p in i.get("user_phones", [])], "job_id": job_id}
+
+
+async def delete_group(group_name):
+    """
+    Deletes a group with its tasks and their completions.
+
+    Returns None if the group does not exist, otherwise a dict with the former
+    members (`phones`) and the id of the background job (`job_id`).
+    """
+    async with _unit() as session:
+        result = await groups.find_one_and_delete({"group_name": group_name}, {"user_phones": 1}, session=session)
+        if result is None:
+            return None
+        job_id = await _cascade("delete_group", [group_name], None, session)
+    _start(job_id)
+    return {"phones": result.get("user_phones", []), "job_id": job_id}
+
+
+async def job_status(job_id):
+    return await cascadejobs.find_one({"_id": job_id}, {"_id": 0, "task_ids": 0, "completions_before": 0})
+
+
+async def _resume():
+    # Each job is tried once, so a job that fails again is not claimed in a loop
+    tried = []
+    while True:
+        job_id = await _claim(include_failed=True, exclude=tried)
+        if job_id is None:
+            return
+        tried.append(job_id)
+        print(job_id, "...")
+        await run_job(job_id)
+        print(job_id, await job_status(job_id))
+
+
+if __name__ == "__main__":
+    asyncio.run(_resume())
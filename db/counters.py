@@ -0,0 +1,59 @@
+"""
+Materialized completion counters.
+
+`TaskCounters` holds one document per `key_time` with the number of
+`CompletedTask` documents recorded for it, so the completion percentage is
+answered with a single point lookup. `/push_task` and `/cancel_task` keep the
+counters up to date with atomic `$inc`; if they ever drift (e.g. a crash
+between the insert and the increment, or manual edits), rebuild them:
+
+    python -m db.counters
+"""
+import asyncio
+from collections import Counter
+
+from pymongo import UpdateOne
+
+from db.dbconn import completedtasks, taskcounters
+
+
+async def increment_completions(key_times):
+    # One upserting $inc per distinct key_time, sent as a single unordered bulk write
+    counts = Counter(key_times)
+    if not counts:
+        return
+    await taskcounters.bulk_write(
+        [UpdateOne({"_id": key_time}, {"$inc": {"count": n}}, upsert=True) for key_time, n in counts.items()],
+        ordered=False,
+    )
+
+
+async def uncount_completions(query, session=None):
+    # Take the completions matching `query` out of the counters before they are deleted
+    counts = await completedtasks.aggregate([
+        {"$match": query},
+        {"$group": {"_id": "$key_time", "count": {"$sum": 1}}},
+    ], session=session).to_list(length=None)
+    if not counts:
+        return
+    await taskcounters.bulk_write(
+        [UpdateOne({"_id": i["_id"]}, {"$inc": {"count": -i["count"]}}) for i in counts],
+        ordered=False, session=session,
+    )
+
+
+async def completion_count(key_time):
+    counter = await taskcounters.find_one({"_id": key_time}, {"count": 1})
+    return counter["count"] if counter else 0
+
+
+async def reconcile_counters():
+    # Rebuild every counter from CompletedTask; counters without completions are removed
+    await completedtasks.aggregate([
+        {"$group": {"_id": "$key_time", "count": {"$sum": 1}}},
+        {"$out": taskcounters.name},
+    ]).to_list(length=None)
+
+
+if __name__ == "__main__":
+    asyncio.run(reconcile_counters())
@@ -0,0 +1,65 @@
+"""
+Conversion of task and completion dates to BSON datetimes.
+
+Task documents keep the ISO string fields that clients read (`start_date`,
+`end_date`, `start_time`, `end_time`) and additionally store `starts_at` and
+`ends_at` as BSON dates, which are what range queries and indexes use.
+Completion documents keep `key_time` as the client-facing key and store
+`key_at` (and `cancel_at` for cancellations) as BSON dates.
+
+All datetimes are naive UTC, which is how pymongo reads them back; values
+with a UTC offset are converted to UTC, values without one are kept as they are.
+"""
+from datetime import date, datetime, time
+
+
+def _hhmm(value: time) -> str:
+    return value.strftime("%H:%M")
+
+
+def _naive_utc(value: datetime) -> datetime:
+    if value.tzinfo is not None:
+        value = (value - value.utcoffset()).replace(tzinfo=None)
+    return value
+
+
+def task_bounds(start_date: date, end_date: date, start_time: time, end_time: time) -> tuple:
+    # (starts_at, ends_at) of a task schedule
+    return (_naive_utc(datetime.combine(start_date, start_time)),
+            _naive_utc(datetime.combine(end_date, end_time)))
+
+
+def task_date_fields(start_date: date, end_date: date, start_time: time, end_time: time) -> dict:
+    # Fields written to a task document for its schedule
+    starts_at, ends_at = task_bounds(start_date, end_date, start_time, end_time)
+    return {
+        "start_date": start_date.isoformat(),
+        "end_date": end_date.isoformat(),
+        "start_time": _hhmm(start_time),
+        "end_time": _hhmm(end_time),
+        "starts_at": starts_at,
+        "ends_at": ends_at,
+    }
+
+
+def parse_datetime(value) -> datetime:
+    # ISO date or datetime string ("2025-04-01", "2025-04-01T09:00") to a naive datetime
+    return _naive_utc(datetime.fromisoformat(str(value).strip().replace("Z", "+00:00")))
+
+
+def parse_time(value) -> time:
+    return time.fromisoformat(str(value).strip())
+
+
+def legacy_task_date_fields(doc: dict) -> dict:
+    """
+    Typed fields for a task stored before `starts_at`/`ends_at` existed.
+
+    Raises:
+        ValueError: If the stored strings can not be parsed.
+    """
+    start_date = parse_datetime(doc["start_date"]).date()
+    end_date = parse_datetime(doc.get("end_date") or doc["start_date"]).date()
+    start_time = parse_time(doc.get("start_time") or "00:00")
+    end_time = parse_time(doc.get("end_time") or "23:59")
+    return task_date_fields(start_date, end_date, start_time, end_time)
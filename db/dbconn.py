@@ -1,22 +1,34 @@
 # Import required modules for MongoDB and environment variable management
-from pymongo import MongoClient
+from motor.motor_asyncio import AsyncIOMotorClient
+from db.monitoring import event_listeners
 import os
 from dotenv import load_dotenv
 load_dotenv()
 
 # Create a MongoDB client instance using the URI
 mongo_uri = os.getenv("MONGO_URL")
+# Database of the application; benchmarks and tests point MONGO_DB at a separate one
+APP_DATABASE = "azubi_wohnen"
+mongo_db = os.getenv("MONGO_DB", APP_DATABASE)
 
-# Access the "azubi_wohnen" database
-client = MongoClient(mongo_uri)
+# Access the application database (MONGO_DB, "azubi_wohnen" by default).
+# Motor wraps pymongo and runs every operation off the event loop, so the
+# handlers can await queries without stalling the other requests on the worker.
+# With METRICS_ENABLED=1 every command is timed per collection and route, see db/monitoring.py
+client = AsyncIOMotorClient(mongo_uri, event_listeners=event_listeners())
 
 
 # Define collections for apartments, users, and temporary users
-users = client.get_database("azubi_wohnen")
+users = client.get_database(mongo_db)
 
 users_collections = users.get_collection("AllUsers")
-users_collections.create_index([("phone", 1)])
 groups = users.get_collection("AllGroups")
 tasks = users.get_collection("Tasks")
 completedtasks = users.get_collection("CompletedTask")
+# Tombstones of deleted tasks, read by the delta sync of /v2/sync_my_task
+deletedtasks = users.get_collection("DeletedTasks")
+# Materialized completion counts per key_time, see db/counters.py
+taskcounters = users.get_collection("TaskCounters")
+# Materialized per-user daily agendas, see db/agenda.py
+agendas = users.get_collection("Agendas")
 
@@ -1,8 +1,32 @@
 from passlib.context import CryptContext
+from fastapi import HTTPException, status
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import os
+import time
 
 # Initialize a CryptContext instance with bcrypt hashing scheme
 pwd_cxt = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+# bcrypt releases the GIL, so a thread pool gives real parallelism without
+# blocking the event loop for the 100-250 ms each hash takes.
+HASH_POOL_WORKERS = int(os.getenv("HASH_POOL_WORKERS", os.cpu_count() or 2))
+# Maximum number of hash jobs (running + waiting) before new ones get 503
+HASH_QUEUE_LIMIT = int(os.getenv("HASH_QUEUE_LIMIT", 64))
+
+_executor = ThreadPoolExecutor(max_workers=HASH_POOL_WORKERS, thread_name_prefix="bcrypt")
+# Only touched from the event loop thread, so no lock is needed
+_pending = 0
+_stats = {
+    "completed": 0,
+    "rejected": 0,
+    "bulk_hashed": 0,
+    "queue_wait_total_s": 0.0,
+    "queue_wait_max_s": 0.0,
+    "hash_time_total_s": 0.0,
+    "hash_time_max_s": 0.0,
+}
+
 
 class Hash:
     # Hash a password using bcrypt
@@ -15,6 +39,79 @@ class Hash:
     def verify(plain_password: str, hashed_password: str) -> bool:
         return pwd_cxt.verify(plain_password, hashed_password)
 
-print(Hash.bcrypt("adminpass"))
-    
 
+async def _run_in_pool(func, *args):
+    if _pending >= HASH_QUEUE_LIMIT:
+        _stats["rejected"] += 1
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Server is busy, please try again later",
+            headers={"Retry-After": "1"})
+    return await _execute(func, *args)
+
+
+async def _execute(func, *args):
+    # Run on the pool, counting the job in _pending and the wait/hash-time stats
+    global _pending
+    queued_at = time.perf_counter()
+
+    def job():
+        started = time.perf_counter()
+        result = func(*args)
+        return result, started - queued_at, time.perf_counter() - started
+
+    _pending += 1
+    try:
+        result, waited, took = await asyncio.get_running_loop().run_in_executor(_executor, job)
+    finally:
+        _pending -= 1
+
+    _stats["completed"] += 1
+    _stats["queue_wait_total_s"] += waited
+    _stats["queue_wait_max_s"] = max(_stats["queue_wait_max_s"], waited)
+    _stats["hash_time_total_s"] += took
+    _stats["hash_time_max_s"] = max(_stats["hash_time_max_s"], took)
+    return result
+
+
+async def hash_password(password: str) -> str:
+    # Hash a password on the bcrypt pool
+    return await _run_in_pool(Hash.bcrypt, password)
+
+
+async def hash_passwords(passwords) -> list:
+    """
+    Hash many passwords on the bcrypt pool, keeping every worker busy.
+
+    Used by bulk imports: at most HASH_POOL_WORKERS hashes are submitted at a
+    time, so the pool is never flooded and logins queue behind at most one
+    round of import hashes instead of being rejected with 503.
+    """
+    slots = asyncio.Semaphore(HASH_POOL_WORKERS)
+
+    # The semaphore, not HASH_QUEUE_LIMIT, bounds the import, so it never gets 503
+    async def one(password):
+        async with slots:
+            return await _execute(Hash.bcrypt, password)
+
+    hashed = await asyncio.gather(*map(one, passwords))
+    _stats["bulk_hashed"] += len(hashed)
+    return hashed
+
+
+async def verify_password(plain_password: str, hashed_password: str) -> bool:
+    # Verify a password on the bcrypt pool
+    return await _run_in_pool(Hash.verify, plain_password, hashed_password)
+
+
+def hash_pool_stats() -> dict:
+    # Snapshot of the bcrypt pool counters
+    completed = _stats["completed"] or 1
+    return {
+        "workers": HASH_POOL_WORKERS,
+        "queue_limit": HASH_QUEUE_LIMIT,
+        "pending": _pending,
+        **_stats,
+        "queue_wait_avg_s": _stats["queue_wait_total_s"] / completed,
+        "hash_time_avg_s": _stats["hash_time_total_s"] / completed,
+    }
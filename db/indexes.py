@@ -0,0 +1,228 @@
+"""
+Declarative index registry for all collections.
+
+Every query that the routes issue is listed in `ROUTE_QUERIES` and must be
+covered by an entry in `INDEXES`; queries that read a whole collection on
+purpose are listed in `KNOWN_SCANS` instead. tests/test_indexes.py fails if
+any route query does a COLLSCAN. `ensure_indexes` is called from
+the application startup hook; the same step can be run by hand before a
+deploy, optionally followed by an `explain()` check of every route query:
+
+    python -m db.indexes            # create missing indexes
+    python -m db.indexes --verify   # also fail if any route query does a COLLSCAN
+"""
+import argparse
+import asyncio
+import sys
+from datetime import datetime
+
+from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING, IndexModel
+
+from db.cascade import cascadejobs
+from db.dbconn import users, users_collections, groups, tasks, completedtasks, deletedtasks, taskcounters, agendas
+from db.pagination import encode_token, page_filter, page_sort
+from db.queries import my_tasks_pipeline
+
+# How long tombstones of deleted tasks are kept; sync tokens older than this get a full resync
+TOMBSTONE_RETENTION_SECONDS = 30 * 24 * 3600
+# Agendas are rebuilt on read, so old ones only need to outlive the stored window
+AGENDA_RETENTION_SECONDS = 90 * 24 * 3600
+
+INDEXES = [
+    (users_collections, [
+        # /login, /register, /get_my_info, /tasks
+        IndexModel([("phone", ASCENDING)], name="phone_1"),
+        # /get_users, /get_users_add, /get_users_receive: users filtered by status
+        IndexModel([("status", ASCENDING)], name="status_1"),
+    ]),
+    (groups, [
+        # /create_group/, /edit_group/, /delete_group, /tasks
+        IndexModel([("group_name", ASCENDING)], name="group_name_1"),
+        # /get_my_task: active groups of a member
+        IndexModel([("user_phones", ASCENDING), ("active", ASCENDING)], name="user_phones_1_active_1"),
+        # /get_my_groups, /delete_user
+        IndexModel([("manager_phone", ASCENDING)], name="manager_phone_1"),
+    ]),
+    (tasks, [
+        # /get_my_task: tasks of several groups sorted by importance
+        IndexModel([("group", ASCENDING), ("importance", DESCENDING)], name="group_1_importance_-1"),
+        # /get_my_created_task/ (keyset pages on importance with _id as tie breaker)
+        IndexModel([("created_by", ASCENDING), ("importance", DESCENDING), ("_id", ASCENDING)], name="created_by_1_importance_-1__id_1"),
+        # /calendar and other date range queries on the typed schedule
+        IndexModel([("group", ASCENDING), ("starts_at", ASCENDING)], name="group_1_starts_at_1"),
+        IndexModel([("created_by", ASCENDING), ("starts_at", ASCENDING)], name="created_by_1_starts_at_1"),
+        # /v2/sync_my_task: tasks changed since the sync token
+        IndexModel([("group", ASCENDING), ("updated_at", ASCENDING)], name="group_1_updated_at_1"),
+    ]),
+    (completedtasks, [
+        # /get_my_task: completions of a user
+        IndexModel([("phone", ASCENDING)], name="phone_1"),
+        # /get_infoprocent_about_task/
+        IndexModel([("key_time", ASCENDING)], name="key_time_1"),
+        # /calendar: completion state of the occurrences in the window
+        IndexModel([("phone", ASCENDING), ("key_time", ASCENDING)], name="phone_1_key_time_1"),
+        # /v2/get_my_task: completions joined per task
+        IndexModel([("id_task", ASCENDING), ("phone", ASCENDING)], name="id_task_1_phone_1"),
+        # /v2/sync_my_task: completions added since the sync token
+        IndexModel([("phone", ASCENDING), ("created_at", ASCENDING)], name="phone_1_created_at_1"),
+    ]),
+    (deletedtasks, [
+        # /v2/sync_my_task: tasks deleted since the sync token
+        IndexModel([("group", ASCENDING), ("deleted_at", ASCENDING)], name="group_1_deleted_at_1"),
+        IndexModel([("deleted_at", ASCENDING)], name="deleted_at_ttl", expireAfterSeconds=TOMBSTONE_RETENTION_SECONDS),
+    ]),
+    (agendas, [
+        # Agendas of group members for a day, updated when a task is created; all agendas of a deleted user
+        IndexModel([("phone", ASCENDING), ("date", ASCENDING)], name="phone_1_date_1"),
+        # Agendas that contain a task, updated when it is edited or deleted
+        IndexModel([("items.task_id", ASCENDING)], name="items.task_id_1"),
+        # Agendas older than the stored window are not read any more
+        IndexModel([("built_at", ASCENDING)], name="built_at_ttl", expireAfterSeconds=AGENDA_RETENTION_SECONDS),
+    ]),
+]
+
+# Placeholders for values in the query shapes below; only the shape matters to the planner
+_PHONE = "+380000000000"
+_ID = ObjectId("000000000000000000000000")
+_DAY = datetime(1970, 1, 1)
+_GROUPS = {"$in": ["a", "b"]}
+
+
+def _page(query, sort_key=None, sort_dir=ASCENDING):
+    # Filter and sort of a keyset page after the first one, built by db/pagination.py itself
+    token = encode_token({"id": str(_ID), "key": 0}) if sort_key else encode_token({"id": str(_ID)})
+    return page_filter(query, token, sort_key, sort_dir), page_sort(sort_key, sort_dir)
+
+
+def _calendar(scope_filter):
+    # /calendar and the agenda build: typed date range or, for unmigrated tasks, the legacy strings
+    return {**scope_filter, "$or": [
+        {"starts_at": {"$lte": _DAY}, "ends_at": {"$gte": _DAY}},
+        {"starts_at": {"$exists": False}, "start_date": {"$lte": "1970-01-01"}},
+    ]}
+
+
+# Every query the routes issue: (route, collection, filter or aggregation pipeline, sort).
+# Writes are listed by their filter. `collection_scans` explains each of them.
+ROUTE_QUERIES = [
+    # AllUsers
+    ("/login, /register, /get_my_info, /tasks", users_collections, {"phone": _PHONE}, None),
+    ("/import_users", users_collections, {"phone": {"$in": [_PHONE]}}, None),
+    ("/edit_user/, /delete_user", users_collections, {"_id": _ID}, None),
+    ("/get_users", users_collections, {"status": {"$ne": "admin"}}, None),
+    ("/get_users", users_collections, {"status": {"$ne": "admin"}}, page_sort()),
+    ("/get_users", users_collections, *_page({"status": {"$ne": "admin"}})),
+    ("/get_users_add", users_collections, {"status": {"$nin": ["admin", "receive"]}}, None),
+    ("/get_users_add", users_collections, {"status": {"$nin": ["admin", "receive"]}}, page_sort()),
+    ("/get_users_add", users_collections, *_page({"status": {"$nin": ["admin", "receive"]}})),
+    ("/get_users_receive", users_collections, {"status": {"$nin": ["admin", "add"]}}, None),
+    ("/get_users_receive", users_collections, {"status": {"$nin": ["admin", "add"]}}, page_sort()),
+    ("/get_users_receive", users_collections, *_page({"status": {"$nin": ["admin", "add"]}})),
+
+    # AllGroups
+    ("/tasks, /create_group/, /edit_group/, /delete_group, /groups/*, /get_infoprocent_about_task/",
+     groups, {"group_name": "group"}, None),
+    ("/get_my_groups, /delete_user", groups, {"manager_phone": _PHONE}, None),
+    ("/get_my_task, /calendar, /agenda (membership cache)", groups, {"user_phones": _PHONE, "active": 1}, None),
+    ("/delete_user", groups, {"user_phones": _PHONE}, None),
+    ("/get_groups/", groups, {}, page_sort()),
+    ("/get_groups/", groups, *_page({})),
+    ("/v2/get_my_task", groups, my_tasks_pipeline(_PHONE), None),
+
+    # Tasks
+    ("/get_my_task", tasks, {"group": _GROUPS}, [("importance", DESCENDING)]),
+    ("/get_my_created_task/", tasks, {"created_by": _PHONE}, [("importance", DESCENDING), ("_id", ASCENDING)]),
+    ("/get_my_created_task/", tasks, *_page({"created_by": _PHONE}, "importance", DESCENDING)),
+    ("/calendar, /agenda", tasks, _calendar({"group": _GROUPS}), None),
+    ("/calendar", tasks, _calendar({"created_by": _PHONE}), None),
+    ("/update_task/, /delete_task/{task_id}", tasks, {"_id": _ID, "created_by": _PHONE}, None),
+    ("/v2/sync_my_task", tasks, {"group": _GROUPS, "updated_at": {"$gte": _DAY}}, None),
+    ("/delete_user, /delete_group", tasks, {"group": _GROUPS}, None),
+    ("/delete_user, /delete_group", tasks, {"_id": {"$in": [_ID]}}, None),
+
+    # CompletedTask
+    ("/get_my_task, /delete_user", completedtasks, {"phone": _PHONE}, None),
+    ("/calendar, /agenda", completedtasks, {"phone": _PHONE, "key_time": {"$in": ["a", "b"]}}, None),
+    ("/v2/get_my_task ($lookup)", completedtasks, {"id_task": str(_ID), "phone": _PHONE}, None),
+    ("/v2/sync_my_task", completedtasks, {"phone": _PHONE, "created_at": {"$gte": _DAY}}, None),
+    ("/delete_user, /delete_group", completedtasks, {"id_task": {"$in": [str(_ID)]}}, None),
+    ("/delete_user (cascade job)", completedtasks, {"phone": _PHONE, "_id": {"$lt": _ID}}, None),
+    ("/delete_user (cascade job)", completedtasks, {"_id": {"$in": [_ID]}}, None),
+
+    # DeletedTasks
+    ("/v2/sync_my_task", deletedtasks, {"group": _GROUPS, "deleted_at": {"$gte": _DAY}}, None),
+
+    # TaskCounters
+    ("/get_infoprocent_about_task/, /push_task, /cancel_task", taskcounters, {"_id": "1970-01-01T09:00"}, None),
+
+    # Agendas
+    ("/agenda, /push_task, /cancel_task", agendas, {"_id": f"{_PHONE}|1970-01-01"}, None),
+    ("/tasks, /update_task/", agendas, {"phone": {"$in": [_PHONE]}, "date": "1970-01-01"}, None),
+    ("/update_task/, /delete_task/{task_id}", agendas, {"items.task_id": str(_ID)}, None),
+    ("/delete_user", agendas, {"phone": _PHONE}, None),
+
+    # CascadeJobs
+    ("/cascade_jobs/{job_id}", cascadejobs, {"_id": "job"}, None),
+]
+
+# Queries that read a whole collection on purpose; they are not explained.
+KNOWN_SCANS = [
+    ("/get_groups/ with paginate=false or NDJSON", groups, {}, "returns every group"),
+    ("python -m db.counters", completedtasks, {}, "rebuilds every counter from all completions"),
+    ("startup (cascade job resume)", cascadejobs,
+     {"$or": [{"status": "running", "updated_at": {"$lt": _DAY}}], "_id": {"$nin": []}}, "a handful of documents"),
+    ("python -m db.cascade", cascadejobs,
+     {"$or": [{"status": "running", "updated_at": {"$lt": _DAY}}, {"status": "failed"}], "_id": {"$nin": ["job"]}},
+     "a handful of documents"),
+    ("membership cache listener", None, {}, "tails a capped collection in $natural order"),
+]
+
+
+async def ensure_indexes():
+    # create_indexes is a no-op for indexes that already exist with the same spec
+    for collection, models in INDEXES:
+        await collection.create_indexes(models)
+
+
+def _has_collscan(node):
+    # Searches the whole explain output, which differs between find, aggregate and server versions
+    if isinstance(node, dict):
+        if node.get("stage") == "COLLSCAN":
+            return True
+        return any(_has_collscan(value) for key, value in node.items() if key != "rejectedPlans")
+    if isinstance(node, list):
+        return any(_has_collscan(value) for value in node)
+    return False
+
+
+async def collection_scans():
+    # Route queries whose winning plan contains a COLLSCAN stage
+    failures = []
+    for route, collection, query, sort in ROUTE_QUERIES:
+        if isinstance(query, list):
+            command = {"aggregate": collection.name, "pipeline": query, "cursor": {}}
+        else:
+            command = {"find": collection.name, "filter": query}
+            if sort:
+                command["sort"] = dict(sort)
+        explained = await users.command({"explain": command, "verbosity": "queryPlanner"})
+        if _has_collscan(explained):
+            failures.append((route, collection.name, query))
+    return failures
+
+
+async def _main(verify):
+    await ensure_indexes()
+    if not verify:
+        return 0
+    failures = await collection_scans()
+    for route, collection, query in failures:
+        print(f"COLLSCAN: {route} -> {collection} {query}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Create registered indexes")
+    parser.add_argument("--verify", action="store_true", help="explain() every route query and fail on COLLSCAN")
+    sys.exit(asyncio.run(_main(parser.parse_args().verify)))
@@ -0,0 +1,211 @@
+"""
+In-process cache of group membership.
+
+Two maps are cached with a TTL and LRU eviction:
+
+- phone -> names of the active groups the phone is a member of;
+- group name -> manager phone, members and the active flag.
+
+Routes that change groups or users call `invalidate` with the affected phones
+and groups. The entries are dropped locally and the invalidation is published
+through the configured backend so that other workers drop them too:
+
+- `local` (default): single worker, nothing is published;
+- `mongo`: invalidations go through a capped collection that every worker tails.
+"""
+import asyncio
+import os
+import time
+import uuid
+from collections import OrderedDict
+
+from pymongo import CursorType
+from pymongo.errors import CollectionInvalid, OperationFailure
+
+from db.dbconn import users, groups
+from logger import logger
+
+MEMBERSHIP_CACHE_TTL = float(os.getenv("MEMBERSHIP_CACHE_TTL", 60))
+MEMBERSHIP_CACHE_SIZE = int(os.getenv("MEMBERSHIP_CACHE_SIZE", 10_000))
+MEMBERSHIP_CACHE_BACKEND = os.getenv("MEMBERSHIP_CACHE_BACKEND", "local")
+
+
+class TTLCache:
+    def __init__(self, max_size=MEMBERSHIP_CACHE_SIZE, ttl=MEMBERSHIP_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        entry = self._data.get(key)
+        if entry is not None and entry[1] > time.monotonic():
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+        if entry is not None:
+            del self._data[key]
+        self.misses += 1
+        return None
+
+    def set(self, key, value):
+        self._data[key] = (value, time.monotonic() + self.ttl)
+        self._data.move_to_end(key)
+        if len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+
+    def discard(self, key):
+        self._data.pop(key, None)
+
+    def clear(self):
+        self._data.clear()
+
+    def stats(self):
+        return {"size": len(self._data), "max_size": self.max_size, "ttl_s": self.ttl,
+                "hits": self.hits, "misses": self.misses}
+
+
+_phone_groups = TTLCache()
+_group_info = TTLCache()
+
+
+def _drop(phones=(), group_names=(), all_groups=False):
+    for phone in phones:
+        _phone_groups.discard(phone)
+    if all_groups:
+        _group_info.clear()
+    for name in group_names:
+        _group_info.discard(name)
+
+
+class LocalBackend:
+    # Single worker: local invalidation is all that is needed
+    async def publish(self, phones, group_names, all_groups):
+        pass
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+
+class MongoBackend:
+    """
+    Shares invalidations between workers through a capped collection.
+
+    Every worker tails the collection with a tailable-await cursor and applies
+    messages published by the other workers. The position is kept in $natural
+    order; if it was overwritten, the local caches are cleared.
+    """
+
+    def __init__(self, name="CacheInvalidations", size=1024 * 1024):
+        self.collection = users.get_collection(name)
+        self.name = name
+        self.size = size
+        self.worker_id = uuid.uuid4().hex
+        self._task = None
+
+    async def publish(self, phones, group_names, all_groups):
+        await self.collection.insert_one({
+            "worker": self.worker_id, "phones": list(phones),
+            "groups": list(group_names), "all_groups": all_groups,
+        })
+
+    async def _listen(self):
+        # Start from the newest message so history is not replayed
+        last = await self.collection.find_one({}, sort=[("$natural", -1)])
+        last_id = last["_id"] if last else None
+        while True:
+            try:
+                # The cursor reads in $natural (insertion) order. ObjectIds of different workers are
+                # not ordered within a second, so a reopened cursor skips up to the last message seen
+                # instead of filtering on _id.
+                cursor = self.collection.find({}, cursor_type=CursorType.TAILABLE_AWAIT)
+                skipping = last_id is not None
+                while cursor.alive:
+                    async for message in cursor:
+                        if skipping:
+                            skipping = message["_id"] != last_id
+                            continue
+                        last_id = message["_id"]
+                        if message["worker"] != self.worker_id:
+                            _drop(message["phones"], message["groups"], message["all_groups"])
+                    if skipping:
+                        # The last message seen was overwritten in the capped collection, so
+                        # invalidations may have been missed; everything read so far is covered by this
+                        logger.warning("Membership cache invalidations were overwritten before being read")
+                        _phone_groups.clear()
+                        _group_info.clear()
+                        skipping = False
+                    await asyncio.sleep(0.1)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Membership cache invalidation listener failed, restarting")
+                # Entries may have missed an invalidation; start clean
+                _phone_groups.clear()
+                _group_info.clear()
+                await asyncio.sleep(1)
+
+    async def start(self):
+        if self.name not in await users.list_collection_names(filter={"name": self.name}):
+            try:
+                await users.create_collection(self.name, capped=True, size=self.size)
+            except CollectionInvalid:
+                # Another worker created it between the check and the create
+                pass
+            except OperationFailure as e:
+                # NamespaceExists: the same race, reported by the server
+                if e.code != 48:
+                    raise
+        # The tailable cursor needs at least one document to stay open
+        await self.publish([], [], False)
+        self._task = asyncio.get_running_loop().create_task(self._listen())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+BACKENDS = {"local": LocalBackend, "mongo": MongoBackend}
+backend = BACKENDS[MEMBERSHIP_CACHE_BACKEND]()
+
+
+async def groups_of(phone):
+    # Names of the active groups that `phone` is a member of
+    cached = _phone_groups.get(phone)
+    if cached is None:
+        cached = tuple([i["group_name"] async for i in groups.find(
+            {'user_phones': phone, 'active': 1}, {"group_name": 1, "_id": 0})])
+        _phone_groups.set(phone, cached)
+    return list(cached)
+
+
+async def group_info(group_name):
+    # Manager, members and active flag of a group, or None if it does not exist
+    cached = _group_info.get(group_name)
+    if cached is None:
+        cached = await groups.find_one(
+            {"group_name": group_name}, {"_id": 0, "manager_phone": 1, "user_phones": 1, "active": 1})
+        if cached is None:
+            return None
+        _group_info.set(group_name, cached)
+    return cached
+
+
+async def invalidate(phones=(), group_names=(), all_groups=False):
+    # Drop entries here and tell the other workers to do the same
+    phones, group_names = set(phones), set(group_names)
+    _drop(phones, group_names, all_groups)
+    await backend.publish(phones, group_names, all_groups)
+
+
+def cache_stats():
+    return {"backend": MEMBERSHIP_CACHE_BACKEND, "phone_groups": _phone_groups.stats(), "group_info": _group_info.stats()}
@@ -0,0 +1,107 @@
+"""
+Resumable migration of task and completion dates to BSON datetimes.
+
+Adds `starts_at`/`ends_at` to `Tasks` and `key_at` (plus `cancel_at` for
+cancellations) to `CompletedTask` documents written before these fields
+existed. Documents are processed in `_id` order in batches; the last processed
+`_id` of every collection is saved in the `Migrations` collection, so an
+interrupted run continues where it stopped. Documents whose strings can not be
+parsed are counted and listed, and left unchanged.
+
+    python -m db.migrate_dates                 # migrate both collections
+    python -m db.migrate_dates --batch-size 5000
+    python -m db.migrate_dates --verify        # count documents still missing typed fields
+    python -m db.migrate_dates --restart       # forget saved progress
+"""
+import argparse
+import asyncio
+import sys
+import time
+
+from pymongo import UpdateOne
+
+from db.dates import legacy_task_date_fields, parse_datetime
+from db.dbconn import users, tasks, completedtasks
+
+MIGRATION_ID = "bson_dates"
+migrations = users.get_collection("Migrations")
+
+
+def _task_update(doc):
+    fields = legacy_task_date_fields(doc)
+    return {"starts_at": fields["starts_at"], "ends_at": fields["ends_at"]}
+
+
+def _completion_update(doc):
+    update = {"key_at": parse_datetime(doc["key_time"])}
+    if doc.get("cancel_time"):
+        update["cancel_at"] = parse_datetime(doc["cancel_time"])
+    return update
+
+
+STEPS = [
+    # collection, filter of documents to convert, projection, update builder
+    (tasks, {"starts_at": {"$exists": False}},
+     {"start_date": 1, "end_date": 1, "start_time": 1, "end_time": 1}, _task_update),
+    (completedtasks, {"key_at": {"$exists": False}},
+     {"key_time": 1, "cancel_time": 1}, _completion_update),
+]
+
+
+async def _migrate(collection, query, projection, build_update, batch_size):
+    progress_key = f"last_id.{collection.name}"
+    state = await migrations.find_one({"_id": MIGRATION_ID}) or {}
+    last_id = state.get("last_id", {}).get(collection.name)
+
+    converted, failed = 0, []
+    started = time.perf_counter()
+    while True:
+        page = dict(query)
+        if last_id is not None:
+            page["_id"] = {"$gt": last_id}
+        batch = await collection.find(page, projection).sort("_id", 1).limit(batch_size).to_list(length=batch_size)
+        if not batch:
+            break
+
+        updates = []
+        for doc in batch:
+            try:
+                updates.append(UpdateOne({"_id": doc["_id"]}, {"$set": build_update(doc)}))
+            except (KeyError, TypeError, ValueError):
+                failed.append(doc["_id"])
+        if updates:
+            await collection.bulk_write(updates, ordered=False)
+        converted += len(updates)
+        last_id = batch[-1]["_id"]
+        await migrations.update_one({"_id": MIGRATION_ID}, {"$set": {progress_key: last_id}}, upsert=True)
+
+        elapsed = time.perf_counter() - started
+        print(f"{collection.name}: {converted} converted, {len(failed)} failed, {converted / elapsed:.0f} docs/s")
+
+    elapsed = time.perf_counter() - started
+    return {"converted": converted, "failed": [str(i) for i in failed], "elapsed_s": round(elapsed, 2),
+            "docs_per_s": round(converted / elapsed, 1) if elapsed else None}
+
+
+async def remaining():
+    return {collection.name: await collection.count_documents(query) for collection, query, _, _ in STEPS}
+
+
+async def _main(args):
+    if args.restart:
+        await migrations.delete_one({"_id": MIGRATION_ID})
+    if args.verify:
+        left = await remaining()
+        print(left)
+        return 1 if any(left.values()) else 0
+    for collection, query, projection, build_update in STEPS:
+        print(collection.name, await _migrate(collection, query, projection, build_update, args.batch_size))
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert stored date strings to BSON datetimes")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--verify", action="store_true", help="count documents that still lack typed fields")
+    parser.add_argument("--restart", action="store_true", help="ignore saved progress and start from the beginning")
+    sys.exit(asyncio.run(_main(parser.parse_args())))
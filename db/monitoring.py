@@ -0,0 +1,95 @@
+"""
+MongoDB command monitoring.
+
+`CommandMetricsListener` is registered on the Motor client when
+METRICS_ENABLED=1. For every command it records the latency per collection,
+command name and originating route (e.g. `Tasks find (GET /get_my_task)`) in
+`metrics.py`, so the commands show up in `/resource_metrics` and `/metrics`.
+
+Commands slower than `MONGO_SLOW_QUERY_MS` are logged with the shape of their
+filter or pipeline; every value is replaced with "?", so phones, ids and
+passwords never reach the log.
+"""
+import json
+import os
+
+from pymongo import monitoring
+
+import metrics
+from logger import logger
+
+MONGO_SLOW_QUERY_MS = float(os.getenv("MONGO_SLOW_QUERY_MS", 100))
+
+# Where the filter of each command lives
+_FILTER_FIELDS = {
+    "find": "filter",
+    "count": "query",
+    "distinct": "query",
+    "findAndModify": "query",
+    "aggregate": "pipeline",
+}
+# Pipeline fields that name collections or fields rather than hold user data
+_KEEP = {"from", "as", "localField", "foreignField"}
+
+
+def redact(value):
+    # Keys and operators are kept, values are replaced with "?"
+    if isinstance(value, dict):
+        return {key: item if key in _KEEP and isinstance(item, str) else redact(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        # Lists of values ($in with thousands of phones) collapse to one placeholder
+        shapes = [redact(item) for item in value if isinstance(item, (dict, list, tuple))]
+        return shapes or ["?"]
+    return "?"
+
+
+def filter_shape(command_name, command):
+    if command_name in _FILTER_FIELDS:
+        return redact(command.get(_FILTER_FIELDS[command_name], {}))
+    if command_name == "update":
+        return [redact(i.get("q", {})) for i in command.get("updates", ())[:1]]
+    if command_name == "delete":
+        return [redact(i.get("q", {})) for i in command.get("deletes", ())[:1]]
+    return None
+
+
+def _collection(command_name, command):
+    name = command.get("collection") if command_name == "getMore" else command.get(command_name)
+    return name if isinstance(name, str) else "-"
+
+
+class CommandMetricsListener(monitoring.CommandListener):
+    def __init__(self, slow_ms=MONGO_SLOW_QUERY_MS):
+        self.slow_s = slow_ms / 1000
+        # (request_id, connection) -> (collection, route, command); filled by started()
+        self._pending = {}
+
+    def started(self, event):
+        self._pending[(event.request_id, event.connection_id)] = (
+            _collection(event.command_name, event.command), metrics.current_route(), event.command)
+
+    def _finished(self, event, failed):
+        pending = self._pending.pop((event.request_id, event.connection_id), None)
+        if pending is None:
+            return
+        collection, route, command = pending
+        elapsed = event.duration_micros / 1_000_000
+        metrics.record_command(collection, event.command_name, route, elapsed, failed)
+        if elapsed >= self.slow_s:
+            shape = filter_shape(event.command_name, command)
+            logger.warning(
+                "Slow MongoDB %s on %s took %.1f ms (%s): %s", event.command_name, collection, elapsed * 1000, route,
+                json.dumps(shape, default=str),
+                extra={"collection": collection, "command": event.command_name, "route": route,
+                       "duration_ms": round(elapsed * 1000, 1)})
+
+    def succeeded(self, event):
+        self._finished(event, False)
+
+    def failed(self, event):
+        self._finished(event, True)
+
+
+def event_listeners():
+    # Listeners passed to the Motor client in db/dbconn.py
+    return [CommandMetricsListener()] if metrics.METRICS_ENABLED else []
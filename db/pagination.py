@@ -0,0 +1,93 @@
+"""
+Keyset pagination shared by the listing routes.
+
+Pages are read with a range condition on the sort key plus `_id` as a tie
+breaker, so each request touches only `limit + 1` documents no matter how
+deep the client has paged. The position is handed to the client as an
+opaque `next` token.
+"""
+import base64
+import json
+import os
+
+from bson import ObjectId
+from fastapi import HTTPException
+from pymongo import ASCENDING, DESCENDING
+
+DEFAULT_PAGE_SIZE = int(os.getenv("DEFAULT_PAGE_SIZE", 100))
+MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", 1000))
+# Listing routes keep returning the full list unless the client opts in with
+# `limit`, `next` or paginate=true. LIST_PAGINATION_DEFAULT=1 pages by default.
+PAGINATE_BY_DEFAULT = os.getenv("LIST_PAGINATION_DEFAULT", "0") == "1"
+
+
+def wants_page(paginate=None, limit=None, token=None):
+    # An explicit paginate wins; otherwise passing `limit` or `next` opts in
+    if paginate is not None:
+        return paginate
+    return PAGINATE_BY_DEFAULT or limit is not None or bool(token)
+
+
+def encode_token(position: dict) -> str:
+    return base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
+
+
+def decode_token(token: str) -> dict:
+    try:
+        position = json.loads(base64.urlsafe_b64decode(token.encode()))
+        position["id"] = ObjectId(position["id"])
+        return position
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid page token")
+
+
+def _after(position, sort_key, sort_dir):
+    # Condition selecting documents that come after `position` in sort order
+    if sort_key is None:
+        return {"_id": {"$gt": position["id"]}}
+    beyond = "$lt" if sort_dir == DESCENDING else "$gt"
+    return {"$or": [
+        {sort_key: {beyond: position["key"]}},
+        {sort_key: position["key"], "_id": {"$gt": position["id"]}},
+    ]}
+
+
+def page_sort(sort_key=None, sort_dir=ASCENDING):
+    sort = [(sort_key, sort_dir)] if sort_key else []
+    return sort + [("_id", ASCENDING)]
+
+
+def page_filter(query, token=None, sort_key=None, sort_dir=ASCENDING):
+    if not token:
+        return query
+    return {"$and": [query, _after(decode_token(token), sort_key, sort_dir)]}
+
+
+def position_of(doc, sort_key=None):
+    position = {"id": str(doc["_id"])}
+    if sort_key is not None:
+        position["key"] = doc.get(sort_key)
+    return position
+
+
+async def keyset_page(collection, query, projection=None, limit=None, token=None,
+                      sort_key=None, sort_dir=ASCENDING, keep_id=True):
+    """
+    Returns `{"items": [...], "next": <token or None>}` for one page of `query`.
+
+    `_id` is always read because it is part of the position; with `keep_id=False`
+    it is dropped from the returned documents, otherwise it is converted to a string.
+    """
+    limit = limit or DEFAULT_PAGE_SIZE
+    if projection is not None:
+        projection = {**projection, "_id": 1}
+    cursor = collection.find(page_filter(query, token, sort_key, sort_dir), projection)
+    docs = await cursor.sort(page_sort(sort_key, sort_dir)).limit(limit + 1).to_list(length=limit + 1)
+    next_token = encode_token(position_of(docs[limit - 1], sort_key)) if len(docs) > limit else None
+    docs = docs[:limit]
+    for doc in docs:
+        if keep_id:
+            doc["_id"] = str(doc["_id"])
+        else:
+            doc.pop("_id")
+    return {"items": docs, "next": next_token}
@@ -0,0 +1,32 @@
+"""
+Aggregation pipelines shared by routes and benchmarks.
+"""
+
+
+def my_tasks_pipeline(phone: str) -> list:
+    """
+    Pipeline over `AllGroups` that returns every task of the user's active groups,
+    sorted by importance, with the user's completions of that task joined in.
+
+    Each output document is a task with `_id` as a string and a `completions`
+    array of `{"key_time", "status"}` entries.
+    """
+    return [
+        {"$match": {"user_phones": phone, "active": 1}},
+        {"$project": {"_id": 0, "group_name": 1}},
+        {"$lookup": {"from": "Tasks", "localField": "group_name", "foreignField": "group", "as": "task"}},
+        {"$unwind": "$task"},
+        {"$replaceRoot": {"newRoot": "$task"}},
+        {"$sort": {"importance": -1}},
+        {"$set": {"_id": {"$toString": "$_id"}}},
+        {"$lookup": {
+            "from": "CompletedTask",
+            "localField": "_id",
+            "foreignField": "id_task",
+            "pipeline": [
+                {"$match": {"phone": phone}},
+                {"$project": {"_id": 0, "key_time": 1, "status": 1}},
+            ],
+            "as": "completions",
+        }},
+    ]
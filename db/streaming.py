@@ -0,0 +1,32 @@
+"""
+NDJSON streaming of Mongo cursors for bulk admin tooling.
+
+A client that sends `Accept: application/x-ndjson` to a listing route gets one
+JSON document per line, read from the cursor in batches of `STREAM_BATCH_SIZE`,
+so memory stays constant and the first bytes go out after the first batch.
+"""
+import json
+import os
+
+from fastapi import Request
+from fastapi.responses import StreamingResponse
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+STREAM_BATCH_SIZE = int(os.getenv("STREAM_BATCH_SIZE", 500))
+
+
+def wants_ndjson(request: Request) -> bool:
+    return NDJSON_MEDIA_TYPE in request.headers.get("accept", "")
+
+
+async def _lines(cursor, keep_id):
+    async for doc in cursor:
+        if keep_id:
+            doc["_id"] = str(doc["_id"])
+        else:
+            doc.pop("_id", None)
+        yield json.dumps(doc, ensure_ascii=False, default=str).encode("utf-8") + b"\n"
+
+
+def ndjson_response(cursor, keep_id=True) -> StreamingResponse:
+    return StreamingResponse(_lines(cursor.batch_size(STREAM_BATCH_SIZE), keep_id), media_type=NDJSON_MEDIA_TYPE)
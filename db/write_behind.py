@@ -0,0 +1,110 @@
+"""
+Write-behind group commit for completion documents.
+
+With `COMPLETION_WRITE_BEHIND=1` the completion routes do not issue their own
+`insert_one`: documents are queued in memory and written together with one
+unordered `insert_many` once `COMPLETION_BATCH_SIZE` documents are queued or
+`COMPLETION_BATCH_DELAY_MS` has passed since the first one. Each request still
+waits for the commit of its own batch, so a successful response means the
+document is stored. The buffer is flushed on application shutdown.
+"""
+import asyncio
+import os
+
+from pymongo.errors import BulkWriteError
+
+from db.agenda import completions_recorded
+from db.counters import increment_completions
+from db.dbconn import completedtasks
+from logger import logger
+
+WRITE_BEHIND_ENABLED = os.getenv("COMPLETION_WRITE_BEHIND", "0") == "1"
+BATCH_SIZE = int(os.getenv("COMPLETION_BATCH_SIZE", 200))
+BATCH_DELAY = int(os.getenv("COMPLETION_BATCH_DELAY_MS", 20)) / 1000
+
+
+class GroupCommitBuffer:
+    def __init__(self, collection, max_batch=BATCH_SIZE, max_delay=BATCH_DELAY, on_commit=None):
+        self.collection = collection
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        # Called with the documents of a batch that were stored
+        self.on_commit = on_commit
+        self._pending = []
+        self._timer = None
+        self._inflight = set()
+
+    async def insert(self, doc):
+        # Queue a document and wait until its batch is committed
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((doc, future))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.max_delay, self._flush)
+        await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.get_running_loop().create_task(self._commit(batch))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+
+    async def _commit(self, batch):
+        docs = [doc for doc, _ in batch]
+        errors = {}
+        try:
+            await self.collection.insert_many(docs, ordered=False)
+        except BulkWriteError as e:
+            errors = {err["index"]: BulkWriteError({"writeErrors": [err]}) for err in e.details["writeErrors"]}
+        except Exception as e:
+            errors = {index: e for index in range(len(batch))}
+
+        stored = [doc for index, doc in enumerate(docs) if index not in errors]
+        if stored and self.on_commit is not None:
+            try:
+                await self.on_commit(stored)
+            except Exception:
+                # Documents are stored; counters can be rebuilt with `python -m db.counters`
+                logger.exception("Write-behind commit callback failed")
+
+        for index, (_, future) in enumerate(batch):
+            if future.done():
+                continue
+            if index in errors:
+                future.set_exception(errors[index])
+            else:
+                future.set_result(None)
+
+    async def close(self):
+        # Commit everything that is still queued
+        self._flush()
+        if self._inflight:
+            await asyncio.gather(*self._inflight, return_exceptions=True)
+
+
+async def completions_saved(docs):
+    # Update the views derived from completions once their documents are stored
+    await increment_completions([doc["key_time"] for doc in docs])
+    await completions_recorded(docs)
+
+
+completion_buffer = GroupCommitBuffer(completedtasks, on_commit=completions_saved) if WRITE_BEHIND_ENABLED else None
+
+
+async def save_completion(doc):
+    # Store a completion document, directly or through the write-behind buffer
+    if completion_buffer is None:
+        await completedtasks.insert_one(doc)
+        await completions_saved([doc])
+    else:
+        await completion_buffer.insert(doc)
+
+
+async def close_write_behind():
+    if completion_buffer is not None:
+        await completion_buffer.close()
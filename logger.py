@@ -1,6 +1,11 @@
+import atexit
+import gzip
+import json
 import logging
 import os
-from logging.handlers import RotatingFileHandler
+import queue
+import shutil
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 
 # Рівень логування із змінної середовища
 log_level_str = os.getenv("LOG_LEVEL", "INFO").upper()
@@ -10,27 +15,106 @@ log_level = getattr(logging, log_level_str, logging.INFO)
 log_file_path = os.getenv("LOG_FILE_PATH", "logs/app.log")
 os.makedirs(os.path.dirname(log_file_path), exist_ok=True)
 
+# Записи передаються у фоновий потік через обмежену чергу, тож обробники запитів
+# не виконують файловий і консольний ввід-вивід (і ротацію) в event loop.
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", 10_000))
+# drop — відкинути запис, якщо черга повна; block — чекати на місце в черзі
+LOG_QUEUE_POLICY = os.getenv("LOG_QUEUE_POLICY", "drop")
+# text або json (один JSON-об'єкт на рядок)
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")
+# Стискати gzip файли після ротації (app.log.N.gz замість app.log.N); вимкнено за замовчуванням,
+# щоб імена файлів не змінювались для інструментів, які їх читають
+LOG_COMPRESS = os.getenv("LOG_COMPRESS", "0") == "1"
+
+# Стандартні атрибути LogRecord; решта — це поля з extra=
+_RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "time": self.formatTime(record, self.datefmt),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        entry.update({k: v for k, v in vars(record).items() if k not in _RECORD_ATTRS})
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class BoundedQueueHandler(QueueHandler):
+    # QueueHandler з обмеженою чергою та політикою drop/block
+    def __init__(self, log_queue, policy=LOG_QUEUE_POLICY):
+        super().__init__(log_queue)
+        self.policy = policy
+        self.dropped = 0
+
+    def enqueue(self, record):
+        if self.policy == "block":
+            self.queue.put(record)
+            return
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def _gzip_namer(name):
+    return name + ".gz"
+
+
+def _gzip_rotator(source, dest):
+    # Виконується в потоці QueueListener під час ротації, а не в обробнику запиту
+    with open(source, "rb") as src, gzip.open(dest, "wb") as dst:
+        shutil.copyfileobj(src, dst)
+    os.remove(source)
+
+
 # Формат логів
-log_format = logging.Formatter(
-    "%(asctime)s [%(levelname)s] - %(message)s",
-    datefmt="%Y-%m-%d %H:%M:%S"
-)
+if LOG_FORMAT == "json":
+    log_format = JsonFormatter(datefmt="%Y-%m-%dT%H:%M:%S")
+else:
+    log_format = logging.Formatter(
+        "%(asctime)s [%(levelname)s] - %(message)s",
+        datefmt="%Y-%m-%d %H:%M:%S"
+    )
 
 # FileHandler з ротацією за розміром
 file_handler = RotatingFileHandler(log_file_path, maxBytes=1_000_000, backupCount=5)
 file_handler.setFormatter(log_format)
 file_handler.setLevel(log_level)
+if LOG_COMPRESS:
+    file_handler.namer = _gzip_namer
+    file_handler.rotator = _gzip_rotator
 
 # ConsoleHandler
 console_handler = logging.StreamHandler()
 console_handler.setFormatter(log_format)
 console_handler.setLevel(log_level)
 
+log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+queue_handler = BoundedQueueHandler(log_queue)
+listener = QueueListener(log_queue, file_handler, console_handler, respect_handler_level=True)
+
 # Отримання логгера
 logger = logging.getLogger("app")
 logger.setLevel(log_level)
 
 # Уникаємо повторного додавання
 if not logger.handlers:
-    logger.addHandler(file_handler)
-    logger.addHandler(console_handler)
+    logger.addHandler(queue_handler)
+    listener.start()
+    # Дописати записи, що залишились у черзі, перед виходом
+    atexit.register(listener.stop)
+
+
+def log_stats():
+    return {
+        "queue_size": log_queue.qsize(),
+        "queue_limit": LOG_QUEUE_SIZE,
+        "policy": queue_handler.policy,
+        "dropped": queue_handler.dropped,
+        "format": LOG_FORMAT,
+    }
@@ -1,34 +1,82 @@
-from fastapi import FastAPI
-import cProfile
+from fastapi import FastAPI, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.openapi.models import OpenAPI
+import hashlib
+import json
 from logger import logger
-from memory_profiler import profile
+import metrics
+import profiler
 from fastapi.openapi.utils import get_openapi
 from routes.users import user_app as users  # Import the correct router object
+from db.indexes import ensure_indexes
+from db.write_behind import close_write_behind
+from db import membership_cache
+from db import cascade
 
-profiler = cProfile.Profile()
-profiler.enable()
 # Initialize FastAPI app
 app = FastAPI()
+
+# The schema is generated once and kept as serialized bytes; it is rebuilt only
+# when the set of registered routes changes.
+_openapi_cache = {"routes": None, "schema": None, "body": None, "etag": None}
+
+def _cached_openapi():
+    routes_key = tuple(id(route) for route in app.routes)
+    if _openapi_cache["routes"] != routes_key:
+        schema = get_openapi(
+            title="My API",
+            version="1.0.0",
+            description="Custom description of my API",
+            routes=app.routes,
+        )
+        body = json.dumps(schema, separators=(",", ":")).encode("utf-8")
+        _openapi_cache.update(
+            routes=routes_key,
+            schema=schema,
+            body=body,
+            etag=f'"{hashlib.sha256(body).hexdigest()}"',
+        )
+    return _openapi_cache
+
+def custom_openapi_schema():
+    return _cached_openapi()["schema"]
+
+app.openapi = custom_openapi_schema
+
+# Drop the built-in /openapi.json route so the cached one below is matched
+app.router.routes = [route for route in app.router.routes if getattr(route, "path", None) != app.openapi_url]
+
 @app.get("/openapi.json", include_in_schema=False)
-async def custom_openapi():
-    return get_openapi(
-        title="My API",
-        version="1.0.0",
-        description="Custom description of my API",
-        routes=app.routes,
-    )
+async def custom_openapi(request: Request):
+    cached = _cached_openapi()
+    if request.headers.get("if-none-match") == cached["etag"]:
+        return Response(status_code=304, headers={"ETag": cached["etag"]})
+    return Response(cached["body"], media_type="application/json", headers={"ETag": cached["etag"]})
+
+# Prometheus scrape endpoint; only served when per-route metrics are collected
+if metrics.METRICS_ENABLED:
+    @app.get("/metrics", include_in_schema=False)
+    async def prometheus_metrics():
+        return Response(metrics.prometheus_text(), media_type="text/plain; version=0.0.4; charset=utf-8")
 
 @app.on_event("startup")
 async def startup_event():
     logger.info("Application is starting...")
+    await ensure_indexes()
+    metrics.start_rss_sampler()
+    await membership_cache.backend.start()
+    # Cascade deletes interrupted by a restart are finished in the background
+    cascade.resume_jobs()
+    # Warm the OpenAPI cache so the first /openapi.json hit does not pay for it
+    _cached_openapi()
 
 @app.on_event("shutdown")
 async def shutdown_event():
     logger.info("Application is shutting down...")
-    profiler.disable()
-    profiler.dump_stats("profile_results.prof")
+    await metrics.stop_rss_sampler()
+    await cascade.stop_jobs()
+    await close_write_behind()
+    await membership_cache.backend.stop()
     
 # Add CORS middleware to handle cross-origin requests
 app.add_middleware(
@@ -39,5 +87,12 @@ app.add_middleware(
     allow_headers=['*']
 )
 
+# Per-route counters are opt-in so the request path stays untouched by default
+if metrics.METRICS_ENABLED:
+    app.add_middleware(metrics.RouteMetricsMiddleware)
+
+# Sampling profiler; a no-op until enabled via PROFILING_ENABLED or /profiling/start
+app.add_middleware(profiler.ProfilingMiddleware)
+
 # Include the `users` router
 app.include_router(users)
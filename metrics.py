@@ -0,0 +1,247 @@
+import asyncio
+import contextvars
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+
+import psutil
+
+# Метрики ресурсів вимкнені за замовчуванням: без METRICS_ENABLED=1
+# на шляху запиту не виконується жодного додаткового коду.
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "0") == "1"
+# Інтервал вимірювання RSS у фоновій задачі (секунди)
+RSS_SAMPLE_INTERVAL = float(os.getenv("METRICS_RSS_INTERVAL", 10))
+
+_process = psutil.Process()
+_rss = {"current_mib": None, "max_mib": None, "samples": 0, "sampled_at": None}
+# Межі кошиків гістограм часу виконання (секунди) та розміру відповіді (байти)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+
+# Команди MongoDB здебільшого швидші за запити, тому їхні кошики дрібніші
+COMMAND_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+# (метод, шаблон маршруту) -> _RouteStats
+_routes = {}
+_in_flight = 0
+# (колекція, команда, маршрут) -> _CommandStats; оновлюється з потоків Motor
+_commands = {}
+_commands_lock = threading.Lock()
+
+# ASGI scope поточного запиту. Motor копіює контекст у свої потоки, тому слухач
+# команд MongoDB бачить маршрут, з якого виконано запит (див. db/monitoring.py).
+current_scope = contextvars.ContextVar("current_scope", default=None)
+_sampler_task = None
+
+
+def sample_rss():
+    # Один замір RSS процесу; викликається лише з фонової задачі
+    rss_mib = _process.memory_info().rss / (1024 * 1024)
+    _rss["current_mib"] = round(rss_mib, 2)
+    _rss["max_mib"] = round(max(_rss["max_mib"] or 0, rss_mib), 2)
+    _rss["samples"] += 1
+    _rss["sampled_at"] = time.time()
+
+
+async def _rss_sampler():
+    while True:
+        sample_rss()
+        await asyncio.sleep(RSS_SAMPLE_INTERVAL)
+
+
+def start_rss_sampler():
+    global _sampler_task
+    if METRICS_ENABLED and _sampler_task is None:
+        _sampler_task = asyncio.get_running_loop().create_task(_rss_sampler())
+
+
+async def stop_rss_sampler():
+    global _sampler_task
+    if _sampler_task is not None:
+        _sampler_task.cancel()
+        try:
+            await _sampler_task
+        except asyncio.CancelledError:
+            pass
+        _sampler_task = None
+
+
+class _RouteStats:
+    __slots__ = ("count", "errors", "total_s", "max_s", "statuses", "latency", "size_total", "size")
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.total_s = 0.0
+        self.max_s = 0.0
+        self.statuses = defaultdict(int)
+        # Лічильники по кошиках (не кумулятивні); останній — для значень понад найбільшу межу
+        self.latency = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.size_total = 0
+        self.size = [0] * (len(SIZE_BUCKETS) + 1)
+
+
+class _CommandStats:
+    __slots__ = ("count", "failures", "total_s", "max_s", "latency")
+
+    def __init__(self):
+        self.count = 0
+        self.failures = 0
+        self.total_s = 0.0
+        self.max_s = 0.0
+        self.latency = [0] * (len(COMMAND_BUCKETS) + 1)
+
+
+def current_route():
+    # Шаблон маршруту поточного запиту; поза запитом — "<background>"
+    scope = current_scope.get()
+    if scope is None:
+        return "<background>"
+    route = scope.get("route")
+    return f'{scope["method"]} {route.path if route is not None else "<unmatched>"}'
+
+
+def record_command(collection, command, route, elapsed, failed=False):
+    key = (collection, command, route)
+    with _commands_lock:
+        stats = _commands.get(key)
+        if stats is None:
+            stats = _commands[key] = _CommandStats()
+        stats.count += 1
+        if failed:
+            stats.failures += 1
+        stats.total_s += elapsed
+        if elapsed > stats.max_s:
+            stats.max_s = elapsed
+        stats.latency[bisect_left(COMMAND_BUCKETS, elapsed)] += 1
+
+
+class RouteMetricsMiddleware:
+    """
+    ASGI middleware, що рахує кількість запитів за статусом, гістограми часу
+    виконання та розміру відповіді для кожного шаблону маршруту (наприклад,
+    `/delete_task/{task_id}`), а також кількість запитів у обробці.
+    Підключається в `main.py` лише при METRICS_ENABLED=1.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        global _in_flight
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+        size = 0
+
+        async def send_wrapper(message):
+            nonlocal status_code, size
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        _in_flight += 1
+        scope_token = current_scope.set(scope)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            current_scope.reset(scope_token)
+            _in_flight -= 1
+            route = scope.get("route")
+            key = (scope["method"], route.path if route is not None else "<unmatched>")
+            stats = _routes.get(key)
+            if stats is None:
+                stats = _routes[key] = _RouteStats()
+            stats.count += 1
+            if status_code >= 500:
+                stats.errors += 1
+            stats.statuses[status_code] += 1
+            stats.total_s += elapsed
+            if elapsed > stats.max_s:
+                stats.max_s = elapsed
+            stats.latency[bisect_left(LATENCY_BUCKETS, elapsed)] += 1
+            stats.size_total += size
+            stats.size[bisect_left(SIZE_BUCKETS, size)] += 1
+
+
+def snapshot():
+    # Поточний стан метрик для адмінського endpoint
+    return {
+        "enabled": METRICS_ENABLED,
+        "rss": dict(_rss),
+        "in_flight": _in_flight,
+        "routes": {
+            f"{method} {path}": {"count": stats.count, "errors": stats.errors, "total_s": stats.total_s,
+                                 "max_s": stats.max_s, "avg_s": stats.total_s / stats.count}
+            for (method, path), stats in _routes.items()
+        },
+        "commands": {
+            f"{collection} {command} ({route})": {"count": stats.count, "failures": stats.failures, "total_s": stats.total_s,
+                                                 "max_s": stats.max_s, "avg_s": stats.total_s / stats.count}
+            for (collection, command, route), stats in list(_commands.items())
+        },
+    }
+
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _histogram(lines, name, labels, buckets, counts, total, count):
+    cumulative = 0
+    for bound, n in zip(buckets, counts):
+        cumulative += n
+        lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+    lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {count}')
+    lines.append(f"{name}_sum{{{labels}}} {total}")
+    lines.append(f"{name}_count{{{labels}}} {count}")
+
+
+def prometheus_text():
+    # Метрики у текстовому форматі Prometheus 0.0.4 для `/metrics`
+    lines = [
+        "# HELP http_requests_total Requests by method, route template and status code.",
+        "# TYPE http_requests_total counter",
+    ]
+    routes = [(f'method="{_label(method)}",route="{_label(path)}"', stats) for (method, path), stats in list(_routes.items())]
+    for labels, stats in routes:
+        for status_code, n in list(stats.statuses.items()):
+            lines.append(f'http_requests_total{{{labels},status="{status_code}"}} {n}')
+
+    lines += ["# HELP http_request_duration_seconds Request latency by route template.",
+              "# TYPE http_request_duration_seconds histogram"]
+    for labels, stats in routes:
+        _histogram(lines, "http_request_duration_seconds", labels, LATENCY_BUCKETS, stats.latency, stats.total_s, stats.count)
+
+    lines += ["# HELP http_response_size_bytes Response body size by route template.",
+              "# TYPE http_response_size_bytes histogram"]
+    for labels, stats in routes:
+        _histogram(lines, "http_response_size_bytes", labels, SIZE_BUCKETS, stats.size, stats.size_total, stats.count)
+
+    lines += ["# HELP mongodb_command_duration_seconds MongoDB command latency by collection, command and originating route.",
+              "# TYPE mongodb_command_duration_seconds histogram"]
+    for (collection, command, route), stats in list(_commands.items()):
+        labels = f'collection="{_label(collection)}",command="{_label(command)}",route="{_label(route)}"'
+        _histogram(lines, "mongodb_command_duration_seconds", labels, COMMAND_BUCKETS, stats.latency, stats.total_s, stats.count)
+    lines += ["# HELP mongodb_command_failures_total Failed MongoDB commands by collection, command and originating route.",
+              "# TYPE mongodb_command_failures_total counter"]
+    for (collection, command, route), stats in list(_commands.items()):
+        labels = f'collection="{_label(collection)}",command="{_label(command)}",route="{_label(route)}"'
+        lines.append(f"mongodb_command_failures_total{{{labels}}} {stats.failures}")
+
+    lines += ["# HELP http_requests_in_flight Requests currently being handled.",
+              "# TYPE http_requests_in_flight gauge",
+              f"http_requests_in_flight {_in_flight}"]
+    if _rss["current_mib"] is not None:
+        lines += ["# HELP process_resident_memory_bytes Last sampled resident set size.",
+                  "# TYPE process_resident_memory_bytes gauge",
+                  f'process_resident_memory_bytes {int(_rss["current_mib"] * 1024 * 1024)}']
+    return "\n".join(lines) + "\n"
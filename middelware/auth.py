@@ -7,23 +7,84 @@ from dotenv import load_dotenv
 load_dotenv()
 from datetime import datetime
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from collections import OrderedDict
+import hashlib
+import time
 
 # Import HTTPBearer for authorization and token handling
 security = HTTPBearer()
 
-# Middleware to extract and return the email from the token payload
-async def auth_middleware_status_return(request: Request):
+# Secret is read once instead of on every request
+SECRET_JWT = os.getenv("SecretJwt")
+# Maximum number of verified tokens kept in memory
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", 10_000))
+
+# sha256(token) -> (claims, exp); most recently used entries are at the end
+_token_cache = OrderedDict()
+_token_cache_stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+
+def verify_token(token: str) -> dict:
+    """
+    Перевіряє JWT токен і повертає його claims.
+
+    Нещодавно перевірені токени зберігаються в LRU-кеші (ключ — sha256 токена),
+    тому повторні запити клієнтів, що часто опитують сервер, не перевіряють підпис знову.
+    Запис з кешу не використовується після `exp` токена.
+
+    Raises:
+        JWTError: Якщо токен недійсний або строк дії закінчився.
+    """
+    digest = hashlib.sha256(token.encode()).digest()
+    entry = _token_cache.get(digest)
+    if entry is not None:
+        claims, expires_at = entry
+        if expires_at is None or expires_at > time.time():
+            _token_cache.move_to_end(digest)
+            _token_cache_stats["hits"] += 1
+            return claims
+        del _token_cache[digest]
+
+    _token_cache_stats["misses"] += 1
+    claims = jwt.decode(token, SECRET_JWT, algorithms=["HS256"])
+    _token_cache[digest] = (claims, claims.get("exp"))
+    if len(_token_cache) > TOKEN_CACHE_SIZE:
+        _token_cache.popitem(last=False)
+        _token_cache_stats["evictions"] += 1
+    return claims
+
+
+def token_cache_stats() -> dict:
+    return {"size": len(_token_cache), "max_size": TOKEN_CACHE_SIZE, **_token_cache_stats}
+
+
+async def get_token_claims(request: Request) -> dict:
+    """
+    Залежність, що декодує токен один раз на запит і зберігає claims у `request.state.claims`.
+
+    Raises:
+        HTTPException: Якщо токен відсутній, недійсний або строк дії закінчився (403 FORBIDDEN).
+    """
+    claims = getattr(request.state, "claims", None)
+    if claims is not None:
+        return claims
+    credentials: HTTPAuthorizationCredentials = await security(request)
     try:
-        credentials: HTTPAuthorizationCredentials = await security(request)
-        token = credentials.credentials
-        # Decode the JWT token using the secret key and HS256 algorithm
-        payload = jwt.decode(token, os.getenv("SecretJwt"), algorithms=["HS256"])
-        # Return email from the payload
-        return str(payload.get("status"))
+        claims = verify_token(credentials.credentials)
     except JWTError:
         # Raise an HTTP 403 error if the token is invalid or expired
         raise HTTPException(
             status_code=403, detail="Token is invalid or expired")
+    request.state.claims = claims
+    return claims
+
+# Middleware to extract and return the email from the token payload
+async def auth_middleware_status_return(request: Request):
+    try:
+        payload = await get_token_claims(request)
+        return str(payload.get("status"))
+    except HTTPException:
+        raise
     except Exception as e:
         # Raise an HTTP 404 error for any other exceptions
         raise HTTPException(status_code=404, detail="Some error")
@@ -43,16 +104,10 @@ async def auth_middleware_phone_return(request: Request):
         HTTPException: Якщо сталася інша помилка (404 NOT FOUND).
     """
     try:
-        credentials: HTTPAuthorizationCredentials = await security(request)
-        token = credentials.credentials
-        # Decode the JWT token using the secret key and HS256 algorithm
-        payload = jwt.decode(token, os.getenv("SecretJwt"), algorithms=["HS256"])
-        # Return email from the payload
+        payload = await get_token_claims(request)
         return str(payload.get("sub"))
-    except JWTError:
-        # Raise an HTTP 403 error if the token is invalid or expired
-        raise HTTPException(
-            status_code=403, detail="Token is invalid or expired")
+    except HTTPException:
+        raise
     except Exception as e:
         # Raise an HTTP 404 error for any other exceptions
         raise HTTPException(status_code=404, detail="Some error")
@@ -61,7 +116,7 @@ async def verify_admin_token(request: Request):
     """
     Verifies if the user is an admin.
 
-    Decodes the JWT token and checks if the user is an admin 
+    Decodes the JWT token and checks if the user is an admin
     by validating the 'sub' field. Raises 403 if not authorized.
 
     Parameters:
@@ -71,15 +126,13 @@ async def verify_admin_token(request: Request):
     - If the token is valid and the user is an admin, stores the payload in `request.state.user`.
     """
     try:
-        credentials: HTTPAuthorizationCredentials = await security(request)
-        token = credentials.credentials
-        payload = jwt.decode(token, os.getenv("SecretJwt"), algorithms=["HS256"])
-        
-        # Check if the user is an admin
-        if payload.get("status") != "admin":
-            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized.")
-        request.state.user = payload  # Store the payload for further use
-    except JWTError:
+        payload = await get_token_claims(request)
+    except HTTPException:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Token is invalid or expired.")
     except Exception as e:
-        raise HTTPException(status_code=403, detail=f"Authorization error: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=403, detail=f"Authorization error: {str(e)}")
+
+    # Check if the user is an admin
+    if payload.get("status") != "admin":
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized.")
+    request.state.user = payload  # Store the payload for further use
@@ -0,0 +1,110 @@
+import asyncio
+import cProfile
+import os
+import random
+import re
+import time
+
+from starlette.routing import Match
+
+# Профілювання вимкнене за замовчуванням. Його можна ввімкнути змінною
+# PROFILING_ENABLED=1 або через адмінські endpoint-и /profiling/start і /profiling/stop.
+PROFILING_DIR = os.getenv("PROFILING_DIR", "profiles")
+# Скільки останніх файлів зберігати для кожного маршруту
+PROFILING_MAX_FILES = int(os.getenv("PROFILING_MAX_FILES", 20))
+
+_state = {
+    "enabled": os.getenv("PROFILING_ENABLED", "0") == "1",
+    # Частка запитів, що профілюються, якщо для маршруту не задано окреме значення
+    "sample_rate": float(os.getenv("PROFILING_SAMPLE_RATE", 0.01)),
+    # Окремі частки для маршрутів, ключ "GET /get_my_task"
+    "route_rates": {},
+    "profiled": 0,
+    "skipped_busy": 0,
+}
+# cProfile охоплює весь потік, а в потоці може бути активний лише один профайлер,
+# тому одночасно профілюється лише один запит. Поки він виконується, на кожному
+# await event loop перемикається на інші запити, і вони теж потрапляють у
+# статистику: файл — це зріз роботи всього event loop за час запиту.
+_active = False
+
+
+def configure(enabled, sample_rate=None, route_rates=None):
+    _state["enabled"] = enabled
+    if sample_rate is not None:
+        _state["sample_rate"] = sample_rate
+    if route_rates is not None:
+        _state["route_rates"] = dict(route_rates)
+
+
+def _route_key(scope):
+    for route in scope["app"].router.routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return f'{scope["method"]} {route.path}'
+    return None
+
+
+def _route_dir(route_key):
+    return os.path.join(PROFILING_DIR, re.sub(r"[^A-Za-z0-9_-]+", "_", route_key).strip("_"))
+
+
+def _dump(route_key, profile):
+    directory = _route_dir(route_key)
+    os.makedirs(directory, exist_ok=True)
+    # Назва нагадує, що у файлі весь event loop, а не лише цей запит
+    profile.dump_stats(os.path.join(directory, f"{time.time_ns()}-loop.prof"))
+    # Ротація: залишаємо лише PROFILING_MAX_FILES найновіших файлів
+    files = sorted(f for f in os.listdir(directory) if f.endswith(".prof"))
+    for name in files[:-PROFILING_MAX_FILES]:
+        os.remove(os.path.join(directory, name))
+
+
+class ProfilingMiddleware:
+    """
+    ASGI middleware, що профілює вибрану частку запитів через cProfile та
+    записує результат у `PROFILING_DIR/<метод>_<маршрут>/*-loop.prof`. Файл
+    містить усе, що виконував event loop за час запиту, включно з іншими запитами.
+    Коли профілювання вимкнене, вартість для запиту — одна перевірка прапорця.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        global _active
+        if not _state["enabled"] or scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        route_key = _route_key(scope)
+        rate = _state["route_rates"].get(route_key, _state["sample_rate"])
+        if route_key is None or random.random() >= rate:
+            await self.app(scope, receive, send)
+            return
+        if _active:
+            _state["skipped_busy"] += 1
+            await self.app(scope, receive, send)
+            return
+
+        _active = True
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            profile.disable()
+            _active = False
+            _state["profiled"] += 1
+            await asyncio.to_thread(_dump, route_key, profile)
+
+
+def status():
+    # Поточні налаштування та список збережених файлів для кожного маршруту
+    files = {}
+    if os.path.isdir(PROFILING_DIR):
+        for route_dir in sorted(os.listdir(PROFILING_DIR)):
+            path = os.path.join(PROFILING_DIR, route_dir)
+            if os.path.isdir(path):
+                files[route_dir] = sorted(f for f in os.listdir(path) if f.endswith(".prof"))
+    return {**_state, "directory": PROFILING_DIR, "max_files": PROFILING_MAX_FILES, "files": files}
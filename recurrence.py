@@ -0,0 +1,129 @@
+import functools
+from datetime import date, timedelta
+
+# Дні тижня, як їх передають клієнти: англійські та українські назви або номери 1-7 (1 — понеділок).
+_DAY_NAMES = {
+    "monday": 0, "mon": 0, "понеділок": 0, "пн": 0,
+    "tuesday": 1, "tue": 1, "вівторок": 1, "вт": 1,
+    "wednesday": 2, "wed": 2, "середа": 2, "ср": 2,
+    "thursday": 3, "thu": 3, "четвер": 3, "чт": 3,
+    "friday": 4, "fri": 4, "пʼятниця": 4, "п'ятниця": 4, "пт": 4,
+    "saturday": 5, "sat": 5, "субота": 5, "сб": 5,
+    "sunday": 6, "sun": 6, "неділя": 6, "нд": 6,
+}
+
+
+def _weekday(day):
+    text = str(day).strip().lower()
+    if text.isdigit():
+        # 1-7 як в ISO; 0 також вважається неділею
+        return (int(text) - 1) % 7
+    return _DAY_NAMES.get(text)
+
+
+@functools.lru_cache(maxsize=1024)
+def _weekdays(repeat_days):
+    # Набір днів тижня (0 — понеділок) з repeat_days; кешується, бо наборів небагато
+    return frozenset(w for w in map(_weekday, repeat_days) if w is not None)
+
+
+def _parse_date(value):
+    try:
+        return date.fromisoformat(str(value)[:10])
+    except ValueError:
+        return None
+
+
+def key_time(day, start_time):
+    # Канонічний ключ виконання, який клієнти передають у keyTime
+    return f"{day.isoformat()}T{start_time}"
+
+
+def _bounds(task, window_start, window_end):
+    # (перший, останній день у вікні, дні тижня) або None, якщо задача не потрапляє у вікно
+    start = _parse_date(task.get("start_date"))
+    if start is None:
+        return None
+    weekdays = _weekdays(tuple(task.get("repeat_days") or ()))
+    if not weekdays:
+        return (start, start, weekdays) if window_start <= start <= window_end else None
+    end = _parse_date(task.get("end_date")) or start
+    first, last = max(start, window_start), min(end, window_end)
+    return (first, last, weekdays) if first <= last else None
+
+
+@functools.lru_cache(maxsize=512)
+def _offsets(weekdays, first_weekday):
+    # Зсуви днів тижня від першого дня вікна у межах тижня, за зростанням
+    return tuple(sorted((weekday - first_weekday) % 7 for weekday in weekdays))
+
+
+def _ordinals(first, last, weekdays):
+    # Порядкові номери дат входжень за зростанням: тиждень за тижнем, без сортування
+    if not weekdays:
+        yield first.toordinal()
+        return
+    offsets = _offsets(weekdays, first.weekday())
+    week, last = first.toordinal(), last.toordinal()
+    while week <= last:
+        for offset in offsets:
+            if week + offset > last:
+                return
+            yield week + offset
+        week += 7
+
+
+def expand(task, window_start, window_end):
+    """
+    Повертає дати, на які задача припадає у вікні [window_start, window_end], за зростанням.
+
+    Задача без repeat_days відбувається один раз — у start_date. Повторювана задача
+    відбувається в кожен з repeat_days між start_date та end_date включно. Дати
+    обчислюються кроком у 7 днів від першого збігу для кожного дня тижня, тому час
+    залежить від кількості входжень, а не від довжини вікна.
+    """
+    bounds = _bounds(task, window_start, window_end)
+    return [date.fromordinal(i) for i in _ordinals(*bounds)] if bounds else []
+
+
+def _order(task):
+    return task.get("start_time") or "", -(task.get("importance") or 0)
+
+
+def _by_day(tasks, window_start, window_end):
+    # Списки задач для кожного дня вікна. Задачі впорядковуються один раз за часом початку
+    # та важливістю, тож кожен день уже відсортований і загальне сортування входжень не потрібне.
+    base = window_start.toordinal()
+    days = [[] for _ in range(window_end.toordinal() - base + 1)]
+    for task in sorted(tasks, key=_order):
+        bounds = _bounds(task, window_start, window_end)
+        if bounds is None:
+            continue
+        fields = (str(task["_id"]), task.get("title"), task.get("group"), task.get("importance"),
+                  task.get("start_time"), task.get("end_time"))
+        for ordinal in _ordinals(*bounds):
+            days[ordinal - base].append(fields)
+    for index, day_tasks in enumerate(days):
+        if day_tasks:
+            yield date.fromordinal(base + index).isoformat(), day_tasks
+
+
+def occurrences(tasks, window_start, window_end):
+    # Усі входження задач у вікні, відсортовані за датою, часом початку та важливістю;
+    # key_time збігається з key_time(day, start_time)
+    return [
+        {"task_id": task_id, "title": title, "group": group, "importance": importance, "date": day,
+         "start_time": start_time, "end_time": end_time, "key_time": f"{day}T{start_time}"}
+        for day, day_tasks in _by_day(tasks, window_start, window_end)
+        for task_id, title, group, importance, start_time, end_time in day_tasks
+    ]
+
+
+def occurrences_by_day(tasks, window_start, window_end):
+    # Те саме, згруповане за датою (ключ — YYYY-MM-DD), без поля "date" у входженнях
+    return {
+        day: [{"task_id": task_id, "title": title, "group": group, "importance": importance,
+               "start_time": start_time, "end_time": end_time, "key_time": f"{day}T{start_time}"}
+              for task_id, title, group, importance, start_time, end_time in day_tasks]
+        for day, day_tasks in _by_day(tasks, window_start, window_end)
+    }
@@ -1,26 +1,40 @@
-from fastapi import APIRouter, HTTPException, status, Depends, Request
-from db.dbconn import users_collections, groups, tasks, completedtasks  # Assuming this is your database collection or function
-from db.hash import Hash
-from jose import jwt
-from logger import logger
+from fastapi import APIRouter, HTTPException, status, Depends, Request, Query
+from typing import Optional
+from db.dbconn import users_collections, groups, tasks, completedtasks, deletedtasks  # Assuming this is your database collection or function
+from db.queries import my_tasks_pipeline
+from db.indexes import TOMBSTONE_RETENTION_SECONDS
+from db.streaming import wants_ndjson, ndjson_response
+from db.counters import completion_count
+from db.write_behind import save_completion, completions_saved
+from db.agenda import agenda_for, task_created, task_updated, task_deleted
+from db import cascade
+from db.membership_cache import groups_of, group_info, invalidate, cache_stats
+from db.dates import task_date_fields, parse_datetime
+from db.pagination import keyset_page, wants_page, MAX_PAGE_SIZE
+from db.hash import hash_password, hash_passwords, verify_password, hash_pool_stats
+from jose import jwt, JWTError
+from logger import logger, log_stats
 from fastapi.encoders import jsonable_encoder
 import os
-from shemas.users import UserLogin, UserRegister, DeleteUserRequest, GroupCreateRequest, DeleteGroupRequest, UserEdit, GroupEdit, Task, TaskTime,TaskTimeCancel, TaskEdit
-from middelware.auth import auth_middleware_status_return, verify_admin_token, auth_middleware_phone_return
+from shemas.users import UserLogin, UserRegister, DeleteUserRequest, GroupCreateRequest, DeleteGroupRequest, UserEdit, GroupEdit, GroupMember, GroupMembers, Task, TaskTime,TaskTimeCancel, TaskEdit, ProfilingConfig, CompletionBatch
+from middelware.auth import auth_middleware_status_return, verify_admin_token, auth_middleware_phone_return, verify_token, token_cache_stats
 from bson import ObjectId
-from datetime import datetime
+from pymongo import ReturnDocument, DESCENDING
+from pymongo.errors import BulkWriteError
+from pydantic import ValidationError
+from datetime import date, datetime, timedelta, timezone
+import base64
+import csv
+import io
+import hashlib
+import json
 import uuid
 from urllib.parse import unquote
-from memory_profiler import profile
-from memory_profiler import memory_usage
-from passlib.context import CryptContext
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+import metrics
+import profiler
+import recurrence
 user_app = APIRouter()  # Correct instantiation of APIRouter
 
-# Функція для моніторингу пам'яті
-def profile_memory():
-    return memory_usage()
-
 @user_app.post("/login")
 async def login_user(user: UserLogin):
     """
@@ -50,10 +64,7 @@ async def login_user(user: UserLogin):
     }
     ```
     """
-    memory_before = profile_memory()
-    # Додати індекс для поля phone
-    found_user = users_collections.find_one({"phone": user.phone}, {"_id": 0, "password": 1})
-    memory_after = profile_memory()
+    found_user = await users_collections.find_one({"phone": user.phone}, {"_id": 0, "password": 1})
     if not found_user:
         error_id = str(uuid.uuid4())  # Генеруємо унікальний ID для помилки
         logger.warning(f"[{error_id}] Login failed for {user.phone}: not found", extra={'user': user.phone})
@@ -63,7 +74,7 @@ async def login_user(user: UserLogin):
         )
 
     # Перевірка пароля
-    if not pwd_context.verify(user.password, found_user["password"]):
+    if not await verify_password(user.password, found_user["password"]):
         error_id = str(uuid.uuid4())  # Генеруємо новий унікальний ID для помилки
         logger.warning(f"[{error_id}] Wrong password for {user.phone}", extra={'user': user.phone})
         raise HTTPException(
@@ -79,13 +90,14 @@ async def login_user(user: UserLogin):
 
     # Логування успішного входу
     logger.info(f"User {user.phone} logged in successfully", extra={'user': user.phone})
-    memory_after_token = profile_memory()
-    logger.info(f"Memory usage after generating token: {memory_after_token[0] - memory_after[0]} MiB")
     return {"token": token}
 
 @user_app.get("/get_status/{token}")
 async def login_user(token:str):
-    payload = jwt.decode(token, os.getenv("SecretJwt"), algorithms=["HS256"])
+    try:
+        payload = verify_token(token)
+    except JWTError:
+        raise HTTPException(status_code=403, detail="Token is invalid or expired")
     return str(payload.get("status"))
 
 @user_app.post("/register", dependencies=[Depends(verify_admin_token)])
@@ -119,56 +131,254 @@ async def login_user(request: Request, user: UserRegister):
         "message": "User successfully registered"
     }
     """
-    existing_user = users_collections .find_one({"phone": user.phone}) # Check if the email already exists in the database
+    existing_user = await users_collections.find_one({"phone": user.phone}) # Check if the email already exists in the database
     if existing_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST, detail="User already exists") # Return error if user exists
-    hashed_password = Hash.bcrypt(user.password) # Hash the password for security
+    hashed_password = await hash_password(user.password) # Hash the password for security
     user.password = hashed_password   
     try:
-        users_collections.insert_one(dict(user)) # Insert new user into database
+        await users_collections.insert_one(dict(user)) # Insert new user into database
     except:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST, detail="There is some problem with the database, please try again later")
     return {"status": "Ok"} # Return success message and token
 
+# Largest number of rows /import_users accepts in one request
+IMPORT_MAX_ROWS = int(os.getenv("IMPORT_MAX_ROWS", 20_000))
+
+@user_app.post("/import_users", dependencies=[Depends(verify_admin_token)])
+async def import_users(request: Request):
+    """
+    Масовий імпорт користувачів: Реєструє багато користувачів одним запитом.
+
+    Тіло запиту — JSON-масив користувачів у форматі `/register` або CSV (`Content-Type: text/csv`)
+    із заголовком `name,phone,password,status`. Паролі хешуються паралельно на всіх потоках пулу bcrypt,
+    наявні телефони перевіряються одним запитом, а нові користувачі вставляються одним `insert_many`.
+
+    **Запит:**
+    - Список користувачів (не більше `IMPORT_MAX_ROWS`, 20 000), кожен з полями name, phone, password, status
+
+    **Відповідь:**
+    - created: Кількість створених користувачів
+    - results: Результат для кожного рядка в порядку запиту: `created`, `invalid` (з помилками валідації),
+      `duplicate` (телефон уже є в базі або раніше у файлі) або `failed` (помилка запису)
+
+    **Помилки:**
+    - 400 BAD REQUEST: Якщо тіло не є JSON-масивом або CSV.
+    - 413 REQUEST ENTITY TOO LARGE: Якщо рядків більше за `IMPORT_MAX_ROWS`.
+
+    **Приклад запиту:**
+    ```
+    name,phone,password,status
+    Ivan Ivanov,+380987654321,securepassword,user
+    Petro Petrov,+380987654322,anotherpassword,user
+    ```
+
+    **Приклад відповіді:**
+    ```json
+    {
+        "created": 1,
+        "results": [
+            {"index": 0, "phone": "+380987654321", "status": "created"},
+            {"index": 1, "phone": "+380987654322", "status": "duplicate"}
+        ]
+    }
+    ```
+"""
+
+    body = await request.body()
+    try:
+        if request.headers.get("content-type", "").startswith("text/csv"):
+            rows = list(csv.DictReader(io.StringIO(body.decode("utf-8-sig"))))
+        else:
+            rows = json.loads(body)
+    except (UnicodeDecodeError, csv.Error, ValueError):
+        raise HTTPException(status_code=400, detail="Expected a JSON array or a CSV file")
+    if not isinstance(rows, list):
+        raise HTTPException(status_code=400, detail="Expected a JSON array or a CSV file")
+    if len(rows) > IMPORT_MAX_ROWS:
+        raise HTTPException(status_code=413, detail=f"At most {IMPORT_MAX_ROWS} users can be imported at once")
+
+    results = [None] * len(rows)
+    valid = []
+    for index, row in enumerate(rows):
+        try:
+            valid.append((index, UserRegister.model_validate(row)))
+        except ValidationError as e:
+            results[index] = {"index": index, "phone": row.get("phone") if isinstance(row, dict) else None, "status": "invalid",
+                              "errors": [{"loc": err["loc"], "msg": err["msg"]} for err in e.errors()]}
+
+    # One query for every phone that is already registered
+    seen = {i["phone"] async for i in users_collections.find(
+        {"phone": {"$in": list({user.phone for _, user in valid})}}, {"phone": 1, "_id": 0})}
+    new = []
+    for index, user in valid:
+        if user.phone in seen:
+            results[index] = {"index": index, "phone": user.phone, "status": "duplicate"}
+            continue
+        seen.add(user.phone)
+        new.append((index, user))
+
+    hashed = await hash_passwords([user.password for _, user in new])
+    docs = [{**dict(user), "password": password} for (_, user), password in zip(new, hashed)]
+    failed = {}
+    if docs:
+        try:
+            await users_collections.insert_many(docs, ordered=False)
+        except BulkWriteError as e:
+            failed = {err["index"]: err["errmsg"] for err in e.details["writeErrors"]}
+
+    for doc_index, (index, user) in enumerate(new):
+        if doc_index in failed:
+            results[index] = {"index": index, "phone": user.phone, "status": "failed", "errors": [{"msg": failed[doc_index]}]}
+        else:
+            results[index] = {"index": index, "phone": user.phone, "status": "created"}
+    return {"created": len(new) - len(failed), "results": results}
+
+@user_app.get("/hash_metrics", dependencies=[Depends(verify_admin_token)])
+async def get_hash_metrics(request: Request):
+    """
+    Метрики пулу хешування паролів: стан черги bcrypt та час виконання.
+
+    **Відповідь:**
+    - workers: Кількість потоків пулу (ціле число)
+    - queue_limit: Максимальна кількість задач у черзі (ціле число)
+    - pending: Задачі, що виконуються або очікують (ціле число)
+    - completed / rejected: Кількість виконаних та відхилених (503) задач
+    - bulk_hashed: Кількість паролів, захешованих масовим імпортом (`/import_users`); вони також
+      входять у pending, completed, queue_wait_* та hash_time_*
+    - queue_wait_*: Час очікування в черзі (секунди)
+    - hash_time_*: Час хешування або перевірки пароля (секунди)
+    """
+    return hash_pool_stats()
+
+@user_app.get("/auth_metrics", dependencies=[Depends(verify_admin_token)])
+async def get_auth_metrics(request: Request):
+    """
+    Метрики кешу токенів: Розмір LRU-кешу перевірених JWT та кількість влучань і промахів.
+    """
+    return token_cache_stats()
+
+@user_app.get("/cache_metrics", dependencies=[Depends(verify_admin_token)])
+async def get_cache_metrics(request: Request):
+    """
+    Метрики кешу членства в групах: Розмір, кількість влучань і промахів для кешів
+    "телефон → групи" та "група → менеджер і учасники".
+    """
+    return cache_stats()
+
+@user_app.get("/resource_metrics", dependencies=[Depends(verify_admin_token)])
+async def get_resource_metrics(request: Request):
+    """
+    Метрики ресурсів: RSS процесу та лічильники запитів по маршрутах.
+
+    Дані збираються лише при METRICS_ENABLED=1; інакше повертається `"enabled": false`.
+
+    **Відповідь:**
+    - enabled: Чи ввімкнено збір метрик (bool)
+    - rss: Останній та максимальний RSS у MiB, кількість замірів
+    - in_flight: Кількість запитів, що обробляються зараз
+    - routes: Для кожного маршруту count, errors, total_s, max_s, avg_s
+    - logging: Заповненість черги логів і кількість відкинутих записів
+    """
+    return {**metrics.snapshot(), "logging": log_stats()}
+
+@user_app.post("/profiling/start", dependencies=[Depends(verify_admin_token)])
+async def start_profiling(request: Request, config: ProfilingConfig):
+    """
+    Запуск профілювання: Вмикає cProfile для вибраної частки запитів.
+
+    Результати записуються в окрему папку для кожного маршруту (`PROFILING_DIR`),
+    зберігаються лише останні `PROFILING_MAX_FILES` файлів. Кожен файл містить роботу всього
+    event loop за час вибраного запиту, включно з паралельними запитами. Файли можна переглядати
+    під час роботи застосунку, наприклад `python -m pstats profiles/GET_get_my_task/<file>-loop.prof`.
+
+    **Запит:**
+    - sample_rate: Частка запитів для профілювання (число, необов'язково)
+    - route_rates: Окремі частки від 0 до 1 для маршрутів (словник, необов'язково)
+
+    **Приклад запиту:**
+    ```json
+    {
+        "sample_rate": 0.05,
+        "route_rates": {"GET /get_my_task": 0.5}
+    }
+    ```
+    """
+    profiler.configure(True, config.sample_rate, config.route_rates)
+    return profiler.status()
+
+@user_app.post("/profiling/stop", dependencies=[Depends(verify_admin_token)])
+async def stop_profiling(request: Request):
+    """
+    Зупинка профілювання: Вимикає профілювання запитів. Збережені файли залишаються.
+    """
+    profiler.configure(False)
+    return profiler.status()
+
+@user_app.get("/profiling", dependencies=[Depends(verify_admin_token)])
+async def get_profiling_status(request: Request):
+    """
+    Стан профілювання: Повертає налаштування, лічильники та список файлів для кожного маршруту.
+    """
+    return profiler.status()
+
 @user_app.get("/get_users", dependencies=[Depends(verify_admin_token)])
-async def get_users(request: Request):
+async def get_users(request: Request, limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE), next: Optional[str] = None, paginate: Optional[bool] = None):
     """
     Отримати список користувачів: Отримує список усіх користувачів, які не є адміністраторами.
 
+    Без параметрів повертає весь список масивом, як раніше. Keyset-пагінація вмикається
+    параметром `limit` (розмір сторінки), `next` (токен наступної сторінки з попередньої відповіді)
+    або `paginate=true`; тоді відповідь — сторінка `{"items": [...], "next": ...}`.
+    LIST_PAGINATION_DEFAULT=1 вмикає сторінки за замовчуванням для всіх клієнтів.
+    З заголовком `Accept: application/x-ndjson` увесь список передається потоком, по одному документу в рядку.
+
     **Запит:**
-    - Немає.
+    - limit: Розмір сторінки (ціле число, необов'язково)
+    - next: Токен наступної сторінки (строка, необов'язково)
+    - paginate: Чи повертати сторінку (bool, необов'язково; без `limit`/`next` — масив)
 
     **Відповідь:**
-    - users: Список користувачів (масив об'єктів).
+    - items: Список користувачів (масив об'єктів); без пагінації (за замовчуванням) — сам масив.
       - _id: Унікальний ідентифікатор користувача (строка)
       - name: Ім'я користувача (строка)
       - phone: Телефон користувача (строка)
       - status: Статус користувача (строка)
+    - next: Токен наступної сторінки або null.
 
-    **Приклад відповіді:**
+    **Приклад відповіді (з `limit`):**
     ```json
-    [
-        {
-            "_id": "607d1f77bcf86cd799439011",
-            "name": "Ivan Ivanov",
-            "phone": "+380987654321",
-            "status": "user"
-        },
-        {
-            "_id": "607d1f77bcf86cd799439012",
-            "name": "Petro Petrov",
-            "phone": "+380987654322",
-            "status": "user"
-        }
-    ]
+    {
+        "items": [
+            {
+                "_id": "607d1f77bcf86cd799439011",
+                "name": "Ivan Ivanov",
+                "phone": "+380987654321",
+                "status": "user"
+            },
+            {
+                "_id": "607d1f77bcf86cd799439012",
+                "name": "Petro Petrov",
+                "phone": "+380987654322",
+                "status": "user"
+            }
+        ],
+        "next": "eyJpZCI6ICI2MDdkMWY3N2JjZjg2Y2Q3OTk0MzkwMTIifQ=="
+    }
+    ```
     """
 
+    if wants_ndjson(request):
+        return ndjson_response(users_collections.find({"status": {"$ne": "admin"}}).sort("_id", 1))
+    if wants_page(paginate, limit, next):
+        return await keyset_page(users_collections, {"status": {"$ne": "admin"}}, limit=limit, token=next)
+
     users = users_collections.find({"status": {"$ne": "admin"}})
     # Преобразуем _id в строку для каждого документа
     users_list = []
-    for user in users:
+    async for user in users:
         user["_id"] = str(user["_id"])  # Преобразуем _id в строку
         users_list.append(user)
     return users_list
@@ -183,6 +393,8 @@ async def delete_user(request: Request, user: DeleteUserRequest):
 
     **Відповідь:**
     - message: Повідомлення про успішне видалення.
+    - job_id: Ідентифікатор фонового видалення задач груп користувача (лише якщо задач багато,
+      прогрес — на `GET /cascade_jobs/{job_id}`).
 
     **Помилки:**
     - 400 BAD REQUEST: Якщо ID користувача некоректне.
@@ -204,22 +416,17 @@ async def delete_user(request: Request, user: DeleteUserRequest):
     # Проверяем валидность ObjectId
     if not ObjectId.is_valid(user.id):
         raise HTTPException(status_code=400, detail="Invalid ID format")
-    result = users_collections.delete_one({"_id": ObjectId(user.id)})
-    
-    if result.deleted_count == 0:
+    # Groups, memberships, tasks, completions and agendas are removed in one unit, see db/cascade.py
+    result = await cascade.delete_user(ObjectId(user.id))
+
+    if result is None:
         raise HTTPException(status_code=404, detail="User not found")
-    
-    tasks_for_delete = [i['group_name'] for i in groups.find({"manager_phone": user.phone}, {'_id':0, 'group_name':1})]
-    
-    
-    print(tasks_for_delete)
-    groups.delete_many({"manager_phone": user.phone})
-    groups.update_many(
-    {"user_phones": {"$in": [user.phone]}},  # Условие для поиска документов
-    {"$pull": {"user_phones": user.phone}}   # Удаление телефона из массива   
-)
-    tasks.delete_many({'group':{"$in": [tasks_for_delete]}})
-    
+
+    # Members of the deleted groups lose them; any group may have lost this member
+    await invalidate(phones=result["phones"], all_groups=True)
+
+    if result["job_id"]:
+        return {"message": "User successfully deleted", "job_id": result["job_id"]}
     return {"message": "User successfully deleted"}
 
 @user_app.post("/delete_group", dependencies=[Depends(verify_admin_token)])
@@ -232,6 +439,8 @@ async def delete_group(request: Request, group: DeleteGroupRequest):
 
     **Відповідь:**
     - message: Повідомлення про успішне видалення групи.
+    - job_id: Ідентифікатор фонового видалення задач групи (лише якщо задач багато,
+      прогрес — на `GET /cascade_jobs/{job_id}`).
 
     **Помилки:**
     - 404 NOT FOUND: Якщо групу не знайдено.
@@ -251,34 +460,86 @@ async def delete_group(request: Request, group: DeleteGroupRequest):
     ```
 """
     
-    result = groups.delete_one({"group_name": group.group_name})
-    
-    if result.deleted_count == 0:
+    result = await cascade.delete_group(group.group_name)
+
+    if result is None:
         raise HTTPException(status_code=404, detail="Group not found")
+    await invalidate(phones=result["phones"], group_names=[group.group_name])
 
-    tasks.delete_many({'group': group.group_name})
-    
+    if result["job_id"]:
+        return {"message": "Group successfully deleted", "job_id": result["job_id"]}
     return {"message": "Group successfully deleted"}
 
+@user_app.get("/cascade_jobs/{job_id}", dependencies=[Depends(verify_admin_token)])
+async def get_cascade_job(request: Request, job_id: str):
+    """
+    Прогрес каскадного видалення: Повертає стан фонового видалення задач після `/delete_user` або `/delete_group`.
+
+    **Відповідь:**
+    - kind: `delete_user` або `delete_group`
+    - groups: Групи, задачі яких видаляються
+    - status: `running`, `done` або `failed`
+    - total_tasks, deleted_tasks, deleted_completions: Прогрес видалення
+
+    **Помилки:**
+    - 404 NOT FOUND: Якщо завдання не знайдено.
+
+    **Приклад відповіді:**
+    ```json
+    {
+        "kind": "delete_user",
+        "groups": ["Team A", "Team B"],
+        "status": "running",
+        "total_tasks": 12000,
+        "deleted_tasks": 4500,
+        "deleted_completions": 61000
+    }
+    ```
+"""
+
+    job = await cascade.job_status(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return jsonable_encoder(job)
+
 @user_app.get("/get_users_add", dependencies=[Depends(verify_admin_token)])
-async def get_users_add(request: Request):
+async def get_users_add(request: Request, limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE), next: Optional[str] = None, paginate: Optional[bool] = None):
     """
     Отримання користувачів для додавання: Повертає список користувачів, які не мають статусу "admin" або "receive".
 
+    Без параметрів повертає весь список масивом, як раніше. Keyset-пагінація вмикається
+    параметром `limit` (розмір сторінки), `next` (токен наступної сторінки з попередньої відповіді)
+    або `paginate=true`; тоді відповідь — сторінка `{"items": [...], "next": ...}`.
+    LIST_PAGINATION_DEFAULT=1 вмикає сторінки за замовчуванням для всіх клієнтів.
+    З заголовком `Accept: application/x-ndjson` увесь список передається потоком, по одному документу в рядку.
+
     **Запит:** 
-    - немає
+    - limit: Розмір сторінки (ціле число, необов'язково)
+    - next: Токен наступної сторінки (строка, необов'язково)
+    - paginate: Чи повертати сторінку (bool, необов'язково; без `limit`/`next` — масив)
 
     **Відповідь:**
-    - users: Список користувачів з їх іменами та телефонами.
+    - items: Список користувачів з їх іменами та телефонами; без пагінації (за замовчуванням) — сам масив.
+    - next: Токен наступної сторінки або null.
 
-    **Приклад відповіді:**
+    **Приклад відповіді (з `limit`):**
     ```json
-    [
-        {"name": "John Doe", "phone": "+380987654321"},
-        {"name": "Jane Doe", "phone": "+380987654322"}
-    ]
+    {
+        "items": [
+            {"name": "John Doe", "phone": "+380987654321"},
+            {"name": "Jane Doe", "phone": "+380987654322"}
+        ],
+        "next": null
+    }
     ```
 """
+    if wants_ndjson(request):
+        return ndjson_response(users_collections.find(
+            {"status": {"$nin": ["admin", "receive"]}}, {"name": 1, "phone": 1, "_id": 0}), keep_id=False)
+    if wants_page(paginate, limit, next):
+        return await keyset_page(users_collections, {"status": {"$nin": ["admin", "receive"]}},
+                                 {"name": 1, "phone": 1}, limit=limit, token=next, keep_id=False)
+
     users = users_collections.find(
         {
         "status": { "$nin": ["admin", "receive"] } 
@@ -289,28 +550,47 @@ async def get_users_add(request: Request):
             "_id": 0     
         }
         );   
-    users = list(users)
+    users = await users.to_list(length=None)
     return users 
 
 @user_app.get("/get_users_receive", dependencies=[Depends(verify_admin_token)])
-async def get_users_receive(request: Request):
+async def get_users_receive(request: Request, limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE), next: Optional[str] = None, paginate: Optional[bool] = None):
     """
     Отримання користувачів для отримання: Повертає список користувачів, які не мають статусу "admin" або "add".
 
+    Без параметрів повертає весь список масивом, як раніше. Keyset-пагінація вмикається
+    параметром `limit` (розмір сторінки), `next` (токен наступної сторінки з попередньої відповіді)
+    або `paginate=true`; тоді відповідь — сторінка `{"items": [...], "next": ...}`.
+    LIST_PAGINATION_DEFAULT=1 вмикає сторінки за замовчуванням для всіх клієнтів.
+    З заголовком `Accept: application/x-ndjson` увесь список передається потоком, по одному документу в рядку.
+
     **Запит:** 
-    - немає
+    - limit: Розмір сторінки (ціле число, необов'язково)
+    - next: Токен наступної сторінки (строка, необов'язково)
+    - paginate: Чи повертати сторінку (bool, необов'язково; без `limit`/`next` — масив)
 
     **Відповідь:**
-    - users: Список користувачів з їх іменами та телефонами.
+    - items: Список користувачів з їх іменами та телефонами; без пагінації (за замовчуванням) — сам масив.
+    - next: Токен наступної сторінки або null.
 
-    **Приклад відповіді:**
+    **Приклад відповіді (з `limit`):**
     ```json
-    [
-        {"name": "John Doe", "phone": "+380987654321"},
-        {"name": "Jane Doe", "phone": "+380987654322"}
-    ]
+    {
+        "items": [
+            {"name": "John Doe", "phone": "+380987654321"},
+            {"name": "Jane Doe", "phone": "+380987654322"}
+        ],
+        "next": null
+    }
     ```
 """
+    if wants_ndjson(request):
+        return ndjson_response(users_collections.find(
+            {"status": {"$nin": ["admin", "add"]}}, {"name": 1, "phone": 1, "_id": 0}), keep_id=False)
+    if wants_page(paginate, limit, next):
+        return await keyset_page(users_collections, {"status": {"$nin": ["admin", "add"]}},
+                                 {"name": 1, "phone": 1}, limit=limit, token=next, keep_id=False)
+
     users = users_collections.find(
         {
         "status": { "$nin": ["admin", "add"] } 
@@ -321,7 +601,7 @@ async def get_users_receive(request: Request):
             "_id": 0     
         }
         );   
-    users = list(users)
+    users = await users.to_list(length=None)
     return users 
 
 @user_app.post("/create_group/", dependencies=[Depends(verify_admin_token)])
@@ -356,7 +636,7 @@ async def create_group(group: GroupCreateRequest):
     }
     ```
 """
-    existing_group = groups.find_one({"group_name": group.group_name}) # Check if the email already exists in the database
+    existing_group = await groups.find_one({"group_name": group.group_name}) # Check if the email already exists in the database
     if existing_group:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST, detail="The group with this name already exists") # Return error if user exists
@@ -366,33 +646,54 @@ async def create_group(group: GroupCreateRequest):
         "user_phones": group.user_phones,
         "active": 1
     }
-    groups.insert_one(group_data)
+    await groups.insert_one(group_data)
+    await invalidate(phones=group.user_phones, group_names=[group.group_name])
     return {"message": "Group successfully created"}
 
 @user_app.get("/get_groups/", dependencies=[Depends(verify_admin_token)])
-async def get_groups(request: Request):
+async def get_groups(request: Request, limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE), next: Optional[str] = None, paginate: Optional[bool] = None):
     """
     Отримання всіх груп: Повертає список всіх груп з бази даних.
 
+    Без параметрів повертає весь список масивом, як раніше. Keyset-пагінація вмикається
+    параметром `limit` (розмір сторінки), `next` (токен наступної сторінки з попередньої відповіді)
+    або `paginate=true`; тоді відповідь — сторінка `{"items": [...], "next": ...}`.
+    LIST_PAGINATION_DEFAULT=1 вмикає сторінки за замовчуванням для всіх клієнтів.
+    З заголовком `Accept: application/x-ndjson` увесь список передається потоком, по одному документу в рядку.
+
     **Запит:** 
-    - немає
+    - limit: Розмір сторінки (ціле число, необов'язково)
+    - next: Токен наступної сторінки (строка, необов'язково)
+    - paginate: Чи повертати сторінку (bool, необов'язково; без `limit`/`next` — масив)
 
     **Відповідь:**
-    - groups: Список груп з їх назвами, телефонами менеджерів, телефонами користувачів та активністю.
+    - items: Список груп з їх назвами, телефонами менеджерів, телефонами користувачів та активністю;
+      без пагінації (за замовчуванням) — сам масив.
+    - next: Токен наступної сторінки або null.
 
-    **Приклад відповіді:**
+    **Приклад відповіді (з `limit`):**
     ```json
-    [
-        {
-            "group_name": "Developers",
-            "manager_phone": "+380987654321",
-            "user_phones": ["+380987654322", "+380987654323"],
-            "active": 1
-        }
-    ]
+    {
+        "items": [
+            {
+                "group_name": "Developers",
+                "manager_phone": "+380987654321",
+                "user_phones": ["+380987654322", "+380987654323"],
+                "active": 1
+            }
+        ],
+        "next": null
+    }
     ```
 """
 
+    if wants_ndjson(request):
+        return ndjson_response(groups.find(
+            {}, {"group_name": 1, "manager_phone": 1, "user_phones": 1, "active": 1, "_id": 0}), keep_id=False)
+    if wants_page(paginate, limit, next):
+        return await keyset_page(groups, {}, {"group_name": 1, "manager_phone": 1, "user_phones": 1, "active": 1},
+                                 limit=limit, token=next, keep_id=False)
+
     groups_all = groups.find({}, {
             "group_name": 1,    
             "manager_phone": 1,  
@@ -400,7 +701,7 @@ async def get_groups(request: Request):
             "active": 1,
             "_id": 0     
         })
-    return list(groups_all)
+    return await groups_all.to_list(length=None)
 
 @user_app.post("/edit_user/", dependencies=[Depends(verify_admin_token)])
 async def edit_user(request: Request, user: UserEdit):
@@ -443,14 +744,14 @@ async def edit_user(request: Request, user: UserEdit):
     if user.name:
         update_data["name"] = user.name
     if user.password:
-        update_data["password"] = Hash.bcrypt(user.password)
+        update_data["password"] = await hash_password(user.password)
     if user.status is not None: 
         update_data["status"] = user.status
 
     if not update_data:
         raise HTTPException(status_code=400, detail="No valid fields to update")
 
-    result = users_collections.update_one(
+    result = await users_collections.update_one(
         {"_id": user_id},
         {"$set": update_data}
     )
@@ -506,16 +807,136 @@ async def edit_group(request: Request, user: GroupEdit):
     if not update_data:
         raise HTTPException(status_code=400, detail="No valid fields to update")
 
-    result = groups.update_one(
+    result = await groups.find_one_and_update(
         {"group_name": user.group_name},
-        {"$set": update_data}
+        {"$set": update_data},
+        {"user_phones": 1}
     )
 
-    if result.matched_count == 0:
+    if result is None:
         raise HTTPException(status_code=404, detail="Group not found")
+    # Both the old and the new members may see a different set of active groups
+    await invalidate(phones=set(result.get("user_phones", [])) | set(user.user_phones), group_names=[user.group_name])
 
     return {"message": "Group updated successfully"}    
 
+async def _change_members(group_name, phones, update):
+    # Apply a $addToSet/$pull delta instead of rewriting the whole user_phones array
+    result = await groups.update_one({"group_name": group_name}, update)
+    if result.matched_count == 0:
+        raise HTTPException(status_code=404, detail="Group not found")
+    # Only the listed phones can see a different set of groups
+    await invalidate(phones=phones, group_names=[group_name])
+    return {"message": "Group updated successfully", "modified": result.modified_count}
+
+@user_app.post("/groups/add_member", dependencies=[Depends(verify_admin_token)])
+async def add_group_member(request: Request, member: GroupMember):
+    """
+    Додавання учасника: Додає один телефон до групи, не передаючи весь список учасників.
+
+    **Запит:**
+    - group_name: Назва групи (строка)
+    - phone: Телефон учасника (строка)
+
+    **Відповідь:**
+    - message: Повідомлення про успішне оновлення групи.
+    - modified: 1, якщо учасника додано, 0 — якщо він уже був у групі.
+
+    **Помилки:**
+    - 404 NOT FOUND: Якщо групу не знайдено.
+
+    **Приклад відповіді:**
+    ```json
+    {
+        "message": "Group updated successfully",
+        "modified": 1
+    }
+    ```
+"""
+
+    return await _change_members(member.group_name, [member.phone], {"$addToSet": {"user_phones": member.phone}})
+
+@user_app.post("/groups/remove_member", dependencies=[Depends(verify_admin_token)])
+async def remove_group_member(request: Request, member: GroupMember):
+    """
+    Видалення учасника: Видаляє один телефон із групи, не передаючи весь список учасників.
+
+    **Запит:**
+    - group_name: Назва групи (строка)
+    - phone: Телефон учасника (строка)
+
+    **Відповідь:**
+    - message: Повідомлення про успішне оновлення групи.
+    - modified: 1, якщо учасника видалено, 0 — якщо його не було в групі.
+
+    **Помилки:**
+    - 404 NOT FOUND: Якщо групу не знайдено.
+
+    **Приклад відповіді:**
+    ```json
+    {
+        "message": "Group updated successfully",
+        "modified": 1
+    }
+    ```
+"""
+
+    return await _change_members(member.group_name, [member.phone], {"$pull": {"user_phones": member.phone}})
+
+@user_app.post("/groups/add_members", dependencies=[Depends(verify_admin_token)])
+async def add_group_members(request: Request, members: GroupMembers):
+    """
+    Додавання учасників: Додає до групи кілька телефонів одним атомарним оновленням.
+
+    **Запит:**
+    - group_name: Назва групи (строка)
+    - phones: Телефони учасників (список строк, до 5000)
+
+    **Відповідь:**
+    - message: Повідомлення про успішне оновлення групи.
+    - modified: 1, якщо додано хоча б одного учасника, інакше 0.
+
+    **Помилки:**
+    - 404 NOT FOUND: Якщо групу не знайдено.
+
+    **Приклад запиту:**
+    ```json
+    {
+        "group_name": "Developers",
+        "phones": ["+380987654324", "+380987654325"]
+    }
+    ```
+"""
+
+    return await _change_members(members.group_name, members.phones, {"$addToSet": {"user_phones": {"$each": members.phones}}})
+
+@user_app.post("/groups/remove_members", dependencies=[Depends(verify_admin_token)])
+async def remove_group_members(request: Request, members: GroupMembers):
+    """
+    Видалення учасників: Видаляє з групи кілька телефонів одним атомарним оновленням.
+
+    **Запит:**
+    - group_name: Назва групи (строка)
+    - phones: Телефони учасників (список строк, до 5000)
+
+    **Відповідь:**
+    - message: Повідомлення про успішне оновлення групи.
+    - modified: 1, якщо видалено хоча б одного учасника, інакше 0.
+
+    **Помилки:**
+    - 404 NOT FOUND: Якщо групу не знайдено.
+
+    **Приклад запиту:**
+    ```json
+    {
+        "group_name": "Developers",
+        "phones": ["+380987654324", "+380987654325"]
+    }
+    ```
+"""
+
+    return await _change_members(members.group_name, members.phones, {"$pull": {"user_phones": {"$in": members.phones}}})
+
 @user_app.get("/get_my_groups")
 async def login_user(request: Request, phone = Depends(auth_middleware_phone_return)):
     """
@@ -535,7 +956,7 @@ async def login_user(request: Request, phone = Depends(auth_middleware_phone_ret
 
     results = groups.find({"manager_phone": phone}, {"group_name": 1, "_id": 0}) 
     results2 = list()
-    for i in results:
+    async for i in results:
         results2.append(i["group_name"])    
     return results2  
 
@@ -564,7 +985,7 @@ async def get_info(request: Request, phone = Depends(auth_middleware_phone_retur
 
     results = users_collections.find({"phone": phone},{"password": 0, "_id": 0}) 
     re2 = list()
-    for i in results:
+    async for i in results:
         re2.append(i)
     print(re2)
     return jsonable_encoder(re2)
@@ -620,17 +1041,14 @@ async def create_task(request: Request, task: Task, phone=Depends(auth_middlewar
     ```
 """
 
-    result = groups.find_one({"group_name": task.group}, {"manager_phone": 1, "_id": 0})
-    name = users_collections.find({'phone': phone},{'name': 1})
+    result = await group_info(task.group)
+    name = await users_collections.find_one({'phone': phone},{'name': 1})
     if not result or result["manager_phone"] != phone:
         raise HTTPException(status_code=404, detail="У вас немає прав для виконання цієї задачі")
     task_data = {
         "title": task.title,
         "description": task.description,
-        "start_date": task.startDate,
-        "end_date": task.endDate,
-        "start_time": task.startTime,
-        "end_time": task.endTime,
+        **task_date_fields(task.startDate, task.endDate, task.startTime, task.endTime),
         "repeat_days": task.repeatDays,
         "group": task.group,
         "task_type": task.taskType,
@@ -638,13 +1056,15 @@ async def create_task(request: Request, task: Task, phone=Depends(auth_middlewar
         "created_by": phone,
         'needphoto': task.needphoto,
         'needcomment': task.needcomment,
-        "created_name": name[0]['name']
+        "created_name": name['name'],
+        "updated_at": datetime.now(timezone.utc)
     }
     try:
-        tasks.insert_one(task_data)
-        return {"message": "Task successfully saved to database"}
+        await tasks.insert_one(task_data)
     except Exception as e:
         raise HTTPException(status_code=404, detail="Failed to save task to database")
+    await task_created(task_data)
+    return {"message": "Task successfully saved to database"}
 
 @user_app.get("/get_my_task")
 async def get_tasks(request: Request, phone=Depends(auth_middleware_phone_return)):
@@ -671,23 +1091,169 @@ async def get_tasks(request: Request, phone=Depends(auth_middleware_phone_return
     ```
 """
 
-    r = groups.find({'user_phones': f"{phone}", 'active': 1},{"group_name": 1, "_id": 0})
     compltasks = completedtasks.find({"phone": f"{phone}"}, {"key_time": 1, "_id": 0})
     tasksCompleteIDs = []
-    for i in compltasks:
+    async for i in compltasks:
         tasksCompleteIDs.append(i['key_time'])
     
-    groups_name = []
-    for i in r:
-        groups_name.append(i["group_name"])
+    groups_name = await groups_of(phone)
     tasks_cursor = tasks.find(
     {'group': {'$in': groups_name}}).sort([('importance', -1)])
-    user_tasks = list(tasks_cursor)
+    user_tasks = await tasks_cursor.to_list(length=None)
     for i in range(0,len(user_tasks)):
         user_tasks[i]["_id"] = str(user_tasks[i]["_id"])    
     user_tasks.append(tasksCompleteIDs)
     return user_tasks
 
+@user_app.get("/v2/get_my_task")
+async def get_tasks_v2(request: Request, phone=Depends(auth_middleware_phone_return)):
+    """
+    Отримання моїх завдань (версія 2): Повертає завдання з груп користувача разом зі станом виконання.
+
+    На відміну від `/get_my_task`, дані збираються одним агрегаційним запитом, а виконання
+    прив'язані до кожного завдання, а не додаються окремим масивом у кінці списку.
+
+    **Запит:** 
+    - phone: Телефон користувача (строка)
+
+    **Відповідь:**
+    - version: Версія формату відповіді (2)
+    - tasks: Список завдань, відсортованих за важливістю; кожне містить `completions` —
+      список виконань цього завдання користувачем (`key_time`, `status`).
+
+    **Приклад відповіді:**
+    ```json
+    {
+        "version": 2,
+        "tasks": [
+            {
+                "_id": "607d1f77bcf86cd799439013",
+                "title": "Complete report",
+                "group": "Developers",
+                "importance": 1,
+                "completions": [
+                    {"key_time": "2025-04-01T09:00", "status": 1}
+                ]
+            }
+        ]
+    }
+    ```
+"""
+
+    user_tasks = await groups.aggregate(my_tasks_pipeline(phone)).to_list(length=None)
+    return {"version": 2, "tasks": user_tasks}
+
+# Writes from different workers are not perfectly ordered by their timestamps,
+# so each delta re-reads a short window before the token.
+SYNC_OVERLAP = timedelta(seconds=5)
+
+def _encode_sync_token(synced_at, groups_digest):
+    raw = json.dumps({"t": synced_at.isoformat(), "g": groups_digest}).encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+def _decode_sync_token(token):
+    try:
+        raw = json.loads(base64.urlsafe_b64decode(token.encode()))
+        return datetime.fromisoformat(raw["t"]), raw["g"]
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid sync token")
+
+@user_app.get("/v2/sync_my_task")
+async def sync_tasks(request: Request, token: str = None, phone=Depends(auth_middleware_phone_return)):
+    """
+    Синхронізація моїх завдань: Повертає лише зміни з моменту попередньої синхронізації.
+
+    Без `token` (або якщо токен застарів чи змінився склад груп користувача) повертається
+    повний набір даних, як у `/v2/get_my_task`, з `"full": true`. Інакше повертаються лише
+    створені або змінені завдання, ідентифікатори видалених завдань та нові виконання.
+    Клієнт зберігає `sync_token` з відповіді і передає його в наступному запиті.
+
+    **Запит:** 
+    - token: Токен попередньої синхронізації (строка, необов'язково)
+
+    **Відповідь:**
+    - version: Версія формату відповіді (2)
+    - full: Чи є відповідь повним набором даних (bool)
+    - tasks: Нові або змінені завдання
+    - deleted: Ідентифікатори видалених завдань (лише для дельти)
+    - completions: Нові виконання користувача (лише для дельти)
+    - sync_token: Токен для наступної синхронізації (строка)
+
+    **Помилки:**
+    - 400 BAD REQUEST: Якщо токен некоректний.
+
+    **Приклад відповіді:**
+    ```json
+    {
+        "version": 2,
+        "full": false,
+        "tasks": [{"_id": "607d1f77bcf86cd799439013", "title": "Complete report", "importance": 1}],
+        "deleted": ["607d1f77bcf86cd799439014"],
+        "completions": [{"id_task": "607d1f77bcf86cd799439013", "key_time": "2025-04-01T09:00", "status": 1}],
+        "sync_token": "eyJ0IjogIjIwMjUtMDQtMDFUMDk6MDA6MDArMDA6MDAiLCAiZyI6ICIuLi4ifQ=="
+    }
+    ```
+"""
+
+    synced_at = datetime.now(timezone.utc)
+    groups_name = sorted(await groups_of(phone))
+    groups_digest = hashlib.sha1("\n".join(groups_name).encode()).hexdigest()
+
+    since = None
+    if token:
+        since, token_digest = _decode_sync_token(token)
+        if token_digest != groups_digest or synced_at - since > timedelta(seconds=TOMBSTONE_RETENTION_SECONDS):
+            since = None
+
+    if since is None:
+        user_tasks = await groups.aggregate(my_tasks_pipeline(phone)).to_list(length=None)
+        return {"version": 2, "full": True, "tasks": user_tasks, "sync_token": _encode_sync_token(synced_at, groups_digest)}
+
+    since -= SYNC_OVERLAP
+    changed = await tasks.find({'group': {'$in': groups_name}, 'updated_at': {'$gte': since}}).to_list(length=None)
+    for task in changed:
+        task["_id"] = str(task["_id"])
+    deleted = [i["task_id"] async for i in deletedtasks.find(
+        {'group': {'$in': groups_name}, 'deleted_at': {'$gte': since}}, {"task_id": 1, "_id": 0})]
+    completions = await completedtasks.find(
+        {'phone': phone, 'created_at': {'$gte': since}}, {"_id": 0, "id_task": 1, "key_time": 1, "status": 1}).to_list(length=None)
+    return {
+        "version": 2,
+        "full": False,
+        "tasks": changed,
+        "deleted": deleted,
+        "completions": completions,
+        "sync_token": _encode_sync_token(synced_at, groups_digest),
+    }
+
+def _completion_doc(task: TaskTime, phone: str) -> dict:
+    return {
+        "start_time": task.start_time,
+        "finish_time": task.finish_time,
+        "pause_start": task.pause_start,
+        "pause_end": task.pause_end,
+        "id_task": task.id_task,
+        "key_time": task.keyTime,
+        "key_at": parse_datetime(task.keyTime),
+        "phone": phone,
+        "comment": task.comment,
+        'status': 1,
+        "created_at": datetime.now(timezone.utc)
+    }
+
+def _cancel_doc(task_cancel: TaskTimeCancel, phone: str) -> dict:
+    return {
+        "cancel_time": task_cancel.cancel_time,
+        "cancel_at": parse_datetime(task_cancel.cancel_time),
+        "id_task": task_cancel.id_task,
+        "key_time": task_cancel.keyTime,
+        "key_at": parse_datetime(task_cancel.keyTime),
+        "phone": phone,
+        "comment": task_cancel.comment,
+        'status': 0,
+        "created_at": datetime.now(timezone.utc)
+    }
+
 @user_app.post("/push_task")
 async def login_user(request: Request, task: TaskTime, phone = Depends(auth_middleware_phone_return)):
     """
@@ -713,18 +1279,8 @@ async def login_user(request: Request, task: TaskTime, phone = Depends(auth_midd
     ```
 """
 
-    task_data = {
-        "start_time": task.start_time,
-        "finish_time": task.finish_time,
-        "pause_start": task.pause_start,
-        "pause_end": task.pause_end,
-        "id_task": task.id_task,
-        "key_time": task.keyTime,
-        "phone": phone,
-        "comment": task.comment,
-        'status': 1
-    }   
-    completedtasks.insert_one(task_data)
+    task_data = _completion_doc(task, phone)
+    await save_completion(task_data)
     return {"message": "Informations about task successfully saved to database"}
 
 @user_app.post("/cancel_task")
@@ -746,27 +1302,191 @@ async def login_user(request: Request, task_cancel: TaskTimeCancel, phone = Depe
     ```
 """
 
-    task_data = {
-        "cancel_time": task_cancel.cancel_time,
-        "id_task": task_cancel.id_task,
-        "key_time": task_cancel.keyTime,
-        "phone": phone,
-        "comment": task_cancel.comment,
-        'status': 0
-    }   
-    completedtasks.insert_one(task_data)
+    task_data = _cancel_doc(task_cancel, phone)
+    await save_completion(task_data)
     return {"message": "Informations about task successfully saved to database"}
 
+@user_app.post("/push_tasks_batch")
+async def push_tasks_batch(request: Request, batch: CompletionBatch, phone = Depends(auth_middleware_phone_return)):
+    """
+    Пакетне збереження виконань: Зберігає кілька виконань та скасувань задач одним запитом.
+
+    Призначено для клієнтів, що накопичили звіти в офлайні. Усі коректні елементи
+    записуються одним невпорядкованим `insert_many`; результат повертається для кожного елемента.
+
+    **Запит:**
+    - items: Список об'єктів `TaskTime` або `TaskTimeCancel` (до 500 елементів)
+
+    **Відповідь:**
+    - saved: Кількість збережених елементів (ціле число)
+    - results: Для кожного елемента `index`, `status` (`saved`, `invalid` або `failed`) та `errors`.
+
+    **Приклад відповіді:**
+    ```json
+    {
+        "saved": 1,
+        "results": [
+            {"index": 0, "status": "saved"},
+            {"index": 1, "status": "invalid", "errors": [{"loc": ["keyTime"], "msg": "Field required"}]}
+        ]
+    }
+    ```
+"""
+
+    results = [None] * len(batch.items)
+    docs, positions = [], []
+    for index, item in enumerate(batch.items):
+        try:
+            if "cancel_time" in item:
+                doc = _cancel_doc(TaskTimeCancel(**item), phone)
+            else:
+                doc = _completion_doc(TaskTime(**item), phone)
+        except ValidationError as e:
+            results[index] = {"index": index, "status": "invalid",
+                              "errors": [{"loc": err["loc"], "msg": err["msg"]} for err in e.errors()]}
+            continue
+        docs.append(doc)
+        positions.append(index)
+
+    failed = {}
+    if docs:
+        try:
+            await completedtasks.insert_many(docs, ordered=False)
+        except BulkWriteError as e:
+            failed = {err["index"]: err["errmsg"] for err in e.details["writeErrors"]}
+
+    saved = []
+    for doc_index, index in enumerate(positions):
+        if doc_index in failed:
+            results[index] = {"index": index, "status": "failed", "errors": [{"msg": failed[doc_index]}]}
+        else:
+            results[index] = {"index": index, "status": "saved"}
+            saved.append(docs[doc_index])
+    await completions_saved(saved)
+    return {"saved": len(saved), "results": results}
+
+# Longest window /calendar expands in one request
+CALENDAR_MAX_DAYS = 62
+
+@user_app.get("/calendar")
+async def get_calendar(request: Request, date_from: date = Query(..., alias="from"), date_to: date = Query(..., alias="to"),
+                       scope: str = Query("my", pattern="^(my|created)$"), phone=Depends(auth_middleware_phone_return)):
+    """
+    Календар: Розгортає задачі (включно з повторюваними за `repeat_days`) у конкретні входження за період.
+
+    **Запит:**
+    - from: Перша дата періоду, YYYY-MM-DD (строка)
+    - to: Остання дата періоду включно, YYYY-MM-DD (строка, не більше 62 днів від `from`)
+    - scope: `my` — задачі груп користувача (за замовчуванням), `created` — задачі, створені користувачем
+
+    **Відповідь:**
+    - Список входжень, відсортованих за датою та часом; `key_time` — канонічний ключ, який
+      передається в `keyTime` у `/push_task` та `/cancel_task`. Для `scope=my` кожне входження
+      містить `status` виконання користувачем (1 — виконано, 0 — скасовано, null — немає звіту).
+
+    **Помилки:**
+    - 400 BAD REQUEST: Якщо період некоректний або довший за 62 дні.
+
+    **Приклад відповіді:**
+    ```json
+    [
+        {
+            "task_id": "607d1f77bcf86cd799439013",
+            "title": "Complete report",
+            "group": "Developers",
+            "importance": 1,
+            "date": "2025-04-02",
+            "start_time": "10:00",
+            "end_time": "18:00",
+            "key_time": "2025-04-02T10:00",
+            "status": null
+        }
+    ]
+    ```
+"""
+
+    if date_to < date_from or (date_to - date_from).days >= CALENDAR_MAX_DAYS:
+        raise HTTPException(status_code=400, detail=f"The period must be between 1 and {CALENDAR_MAX_DAYS} days")
+
+    window_start = datetime.combine(date_from, datetime.min.time())
+    window_end = datetime.combine(date_to, datetime.max.time())
+    query = {"$or": [
+        {"starts_at": {"$lte": window_end}, "ends_at": {"$gte": window_start}},
+        # Tasks not yet converted by `python -m db.migrate_dates`
+        {"starts_at": {"$exists": False}, "start_date": {"$lte": date_to.isoformat()}},
+    ]}
+    if scope == "my":
+        query["group"] = {"$in": await groups_of(phone)}
+    else:
+        query["created_by"] = phone
+    projection = {"title": 1, "group": 1, "importance": 1, "start_date": 1, "end_date": 1,
+                  "start_time": 1, "end_time": 1, "repeat_days": 1}
+    window_tasks = await tasks.find(query, projection).to_list(length=None)
+    result = recurrence.occurrences(window_tasks, date_from, date_to)
+
+    if scope == "my" and result:
+        done = {}
+        async for i in completedtasks.find(
+                {"phone": phone, "key_time": {"$in": list({o["key_time"] for o in result})}},
+                {"_id": 0, "id_task": 1, "key_time": 1, "status": 1}):
+            done[(i.get("id_task"), i["key_time"])] = i.get("status")
+        for occurrence in result:
+            occurrence["status"] = done.get((occurrence["task_id"], occurrence["key_time"]))
+    return result
+
+@user_app.get("/agenda")
+async def get_agenda(request: Request, day: Optional[date] = None, phone=Depends(auth_middleware_phone_return)):
+    """
+    Порядок денний: Повертає входження задач груп користувача на один день разом зі статусом виконання.
+
+    Відповідь береться з попередньо зібраного порядку денного користувача на цей день, який
+    оновлюється при створенні, зміні та видаленні задач і при звітах про виконання.
+
+    **Запит:**
+    - day: Дата, YYYY-MM-DD (строка, необов'язково; за замовчуванням — сьогодні)
+
+    **Відповідь:**
+    - Список входжень за день у форматі `/calendar`, без поля `date`, відсортований за часом початку
+      та важливістю; `status` — 1 (виконано), 0 (скасовано) або null (немає звіту).
+
+    **Приклад відповіді:**
+    ```json
+    [
+        {
+            "task_id": "607d1f77bcf86cd799439013",
+            "title": "Complete report",
+            "group": "Developers",
+            "importance": 1,
+            "start_time": "10:00",
+            "end_time": "18:00",
+            "key_time": "2025-04-02T10:00",
+            "status": 1
+        }
+    ]
+    ```
+"""
+
+    return await agenda_for(phone, day or date.today())
+
 @user_app.get("/get_my_created_task/")
-async def get_tasks(request: Request, phone=Depends(auth_middleware_phone_return)):
+async def get_tasks(request: Request, limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE), next: Optional[str] = None, paginate: Optional[bool] = None, phone=Depends(auth_middleware_phone_return)):
     """
     Отримати інформацію про завдання: Отримує завдання, створені поточним користувачем.
 
+    Без параметрів повертає весь список масивом, як раніше. Keyset-пагінація вмикається
+    параметром `limit` (розмір сторінки), `next` (токен наступної сторінки з попередньої відповіді)
+    або `paginate=true`; тоді відповідь — сторінка `{"items": [...], "next": ...}`.
+    LIST_PAGINATION_DEFAULT=1 вмикає сторінки за замовчуванням для всіх клієнтів.
+    З заголовком `Accept: application/x-ndjson` увесь список передається потоком, по одному документу в рядку.
+
     **Запит:**
     - phone: Телефон поточного користувача (строка).
+    - limit: Розмір сторінки (ціле число, необов'язково)
+    - next: Токен наступної сторінки (строка, необов'язково)
+    - paginate: Чи повертати сторінку (bool, необов'язково; без `limit`/`next` — масив)
 
     **Відповідь:**
-    - tasks: Список завдань, створених користувачем (масив об'єктів).
+    - items: Список завдань, створених користувачем (масив об'єктів); без пагінації (за замовчуванням) — сам масив.
       - _id: Унікальний ідентифікатор завдання (строка)
       - title: Назва завдання (строка)
       - description: Опис завдання (строка)
@@ -776,51 +1496,78 @@ async def get_tasks(request: Request, phone=Depends(auth_middleware_phone_return
       - end_time: Час закінчення завдання (строка)
       - importance: Важливість завдання (число)
       - status: Статус завдання (число)
+    - next: Токен наступної сторінки або null.
 
-    **Приклад відповіді:**
+    **Приклад відповіді (з `limit`):**
     ```json
-    [
-        {
-            "_id": "607d1f77bcf86cd799439013",
-            "title": "Task 1",
-            "description": "Description of task 1",
-            "start_date": "2025-04-01",
-            "end_date": "2025-04-02",
-            "start_time": "08:00",
-            "end_time": "12:00",
-            "importance": 1,
-            "status": 0
-        },
-        {
-            "_id": "607d1f77bcf86cd799439014",
-            "title": "Task 2",
-            "description": "Description of task 2",
-            "start_date": "2025-04-03",
-            "end_date": "2025-04-04",
-            "start_time": "10:00",
-            "end_time": "14:00",
-            "importance": 2,
-            "status": 1
-        }
-    ]
+    {
+        "items": [
+            {
+                "_id": "607d1f77bcf86cd799439014",
+                "title": "Task 2",
+                "description": "Description of task 2",
+                "start_date": "2025-04-03",
+                "end_date": "2025-04-04",
+                "start_time": "10:00",
+                "end_time": "14:00",
+                "importance": 2,
+                "status": 1
+            },
+            {
+                "_id": "607d1f77bcf86cd799439013",
+                "title": "Task 1",
+                "description": "Description of task 1",
+                "start_date": "2025-04-01",
+                "end_date": "2025-04-02",
+                "start_time": "08:00",
+                "end_time": "12:00",
+                "importance": 1,
+                "status": 0
+            }
+        ],
+        "next": "eyJpZCI6ICI2MDdkMWY3N2JjZjg2Y2Q3OTk0MzkwMTMiLCAia2V5IjogMX0="
+    }
+    ```
     """
 
+    if wants_ndjson(request):
+        return ndjson_response(tasks.find({'created_by': phone}).sort([('importance', -1), ('_id', 1)]))
+    if wants_page(paginate, limit, next):
+        return await keyset_page(tasks, {'created_by': phone}, limit=limit, token=next,
+                                 sort_key="importance", sort_dir=DESCENDING)
+
     tasks_cursor = tasks.find(
     {'created_by': phone}).sort([('importance', -1)])
-    user_tasks = list(tasks_cursor)
+    user_tasks = await tasks_cursor.to_list(length=None)
     for i in range(0,len(user_tasks)):
         user_tasks[i]["_id"] = str(user_tasks[i]["_id"])    
     return user_tasks
 
 @user_app.get("/get_infoprocent_about_task/{group}/{task_id}")
-async def get_tasks(request: Request, group: str, task_id: str):
+async def get_tasks(request: Request, group: str, task_id: str, phone=Depends(auth_middleware_phone_return)):
+    """
+    Відсоток виконання задачі: Повертає частку учасників групи, що відзвітували по задачі.
+
+    Кількість звітів береться з лічильника `TaskCounters`, тому запит не залежить від їх кількості.
+
+    **Запит:**
+    - group: Назва групи (строка)
+    - task_id: Ключ часу задачі `key_time` (строка, URL-кодована)
+
+    **Відповідь:**
+    - Відсоток (число); 0, якщо в групі немає учасників.
+
+    **Помилки:**
+    - 404 NOT FOUND: Якщо групу не знайдено.
+    """
     task_id = unquote(task_id)
-    print(task_id)
-    count = groups.find_one(
-    {'group_name': group}) 
-    count2 = list(completedtasks.find({'key_time': task_id}))
-    print(len(count2))
-    return (len(count2)/len(count['user_phones'])) * 100
+    group_doc = await groups.find_one(
+    {'group_name': group}, {"_id": 0, "members": {"$size": {"$ifNull": ["$user_phones", []]}}})
+    if not group_doc:
+        raise HTTPException(status_code=404, detail="Group not found")
+    if group_doc["members"] == 0:
+        return 0
+    return (await completion_count(task_id) / group_doc["members"]) * 100
     
 @user_app.delete("/delete_task/{task_id}")
 async def delete_group(request: Request, task_id: str, phone=Depends(auth_middleware_phone_return)):
@@ -851,11 +1598,15 @@ async def delete_group(request: Request, task_id: str, phone=Depends(auth_middle
     ```
 """
 
-    result = tasks.delete_one({"_id": ObjectId(task_id), 'created_by':phone})
+    result = await tasks.find_one_and_delete({"_id": ObjectId(task_id), 'created_by':phone}, {"group": 1})
     
-    if result.deleted_count == 0:
+    if result is None:
         raise HTTPException(status_code=404, detail="The task was not found or you do not have sufficient rights")
     
+    # Tombstone so that delta sync can tell clients to drop the task
+    await deletedtasks.insert_one({"task_id": task_id, "group": result["group"], "deleted_at": datetime.now(timezone.utc)})
+    await task_deleted(task_id)
+
     return {"message": "Group successfully deleted"}
 
 @user_app.put("/update_task/")
@@ -905,29 +1656,32 @@ async def change_task(request: Request, task: TaskEdit, phone = Depends(auth_mid
     task_data = {
         "title": task.title,
         "description": task.description,
-        "start_date": task.start_date,
-        "end_date": task.end_date,
-        "start_time": task.start_time,
-        "end_time": task.end_time,
+        **task_date_fields(task.start_date, task.end_date, task.start_time, task.end_time),
         "repeat_days": task.repeat_days,
         "group": task.group,
         "task_type": task.task_type,
         "importance": task.importance,
         'needcomment': task.needcomment,
-        'needphoto': task.needphoto
+        'needphoto': task.needphoto,
+        "updated_at": datetime.now(timezone.utc)
     }
     try:
-        result = tasks.update_one(
+        result = await tasks.find_one_and_update(
             {"_id": ObjectId(task.taskid), 'created_by':phone},  
-            {"$set": task_data}  
+            {"$set": task_data},
+            {"group": 1},
+            return_document=ReturnDocument.BEFORE
         )
-        
-        if result:
-            return {"message": "Group successfully updated"}
-        else:
-            raise HTTPException(status_code=404, detail=f"Failed to update task to database: {str(e)}")
     except Exception as e:
         raise HTTPException(status_code=404, detail=f"Failed to update task to database: {str(e)}")
+
+    if not result:
+        raise HTTPException(status_code=404, detail="The task was not found or you do not have sufficient rights")
+    if result.get("group") != task.group:
+        # Members of the old group must drop the task on their next delta sync
+        await deletedtasks.insert_one({"task_id": task.taskid, "group": result.get("group"), "deleted_at": task_data["updated_at"]})
+    await task_updated({**task_data, "_id": task.taskid})
+    return {"message": "Group successfully updated"}
     
     
 
@@ -1,9 +1,11 @@
 # Import the googlemaps library and dotenv to load environment variables
-from pydantic import BaseModel, EmailStr, Field, validator
+from pydantic import BaseModel, EmailStr, Field, validator, field_validator, model_validator
+from datetime import date, time, datetime
 from fastapi import HTTPException, status
 import re
+from db.dates import task_bounds
 from typing import Optional
-from typing import List, Optional
+from typing import Annotated, Any, Dict, List, Optional
 
 # Model to represent a user's registration data
 class UserLogin(BaseModel):
@@ -83,7 +85,7 @@ class DeleteUserRequest(BaseModel):
 
     **Атрибути:**
     - id: Унікальний ідентифікатор користувача (строка).
-    - phone: Номер телефону користувача (строка).
+    - phone: Номер телефону користувача (строка, необов'язково; не використовується — телефон береться з документа користувача).
 
     **Приклад:**
     ```json
@@ -95,7 +97,7 @@ class DeleteUserRequest(BaseModel):
     """
 
     id: str
-    phone: str
+    phone: Optional[str] = None
 
 class DeleteGroupRequest(BaseModel):
     group_name: str
@@ -149,6 +151,46 @@ class GroupEdit(BaseModel):
     user_phones: List[str]  # Список пользователей
     active: int
 
+class GroupMember(BaseModel):
+    """
+    Модель учасника групи: Використовується для додавання або видалення одного учасника.
+
+    **Атрибути:**
+    - group_name: Назва групи (строка).
+    - phone: Номер телефону учасника (строка).
+
+    **Приклад:**
+    ```json
+    {
+        "group_name": "Team A",
+        "phone": "+380987654322"
+    }
+    ```
+    """
+
+    group_name: str
+    phone: str
+
+class GroupMembers(BaseModel):
+    """
+    Модель учасників групи: Використовується для додавання або видалення кількох учасників одним запитом.
+
+    **Атрибути:**
+    - group_name: Назва групи (строка).
+    - phones: Список телефонів учасників (від 1 до 5000 строк).
+
+    **Приклад:**
+    ```json
+    {
+        "group_name": "Team A",
+        "phones": ["+380987654322", "+380987654323"]
+    }
+    ```
+    """
+
+    group_name: str
+    phones: List[str] = Field(..., min_length=1, max_length=5000)
+
 class Task(BaseModel):
     """
     Модель для задачі: Використовується для створення або оновлення задачі.
@@ -156,10 +198,10 @@ class Task(BaseModel):
     **Атрибути:**
     - title: Заголовок задачі (строка).
     - description: Опис задачі (строка).
-    - startDate: Дата початку задачі (строка).
-    - endDate: Дата закінчення задачі (строка).
-    - startTime: Час початку задачі (строка).
-    - endTime: Час закінчення задачі (строка).
+    - startDate: Дата початку задачі (дата YYYY-MM-DD).
+    - endDate: Дата закінчення задачі (дата YYYY-MM-DD).
+    - startTime: Час початку задачі (час HH:MM).
+    - endTime: Час закінчення задачі (час HH:MM).
     - repeatDays: Дні тижня, на які повторюється задача (список строк).
     - group: Назва групи, до якої належить задача (строка).
     - taskType: Тип задачі (строка).
@@ -188,16 +230,24 @@ class Task(BaseModel):
 
     title: str
     description: str
-    startDate: str
-    endDate: str
-    startTime: str
-    endTime: str
+    startDate: date
+    endDate: date
+    startTime: time
+    endTime: time
     repeatDays: List[str] = []
     group: str
     taskType: str
     importance: int
     needphoto: int
     needcomment: int
+
+    @model_validator(mode="after")
+    def validate_schedule(self):
+        # Кінець раніше за початок (у т.ч. endTime < startTime того ж дня) робить задачу невидимою для вибірок за періодом
+        starts_at, ends_at = task_bounds(self.startDate, self.endDate, self.startTime, self.endTime)
+        if ends_at < starts_at:
+            raise ValueError("endDate/endTime must not be before startDate/startTime")
+        return self
  
 class TaskEdit(BaseModel):
     """
@@ -206,10 +256,10 @@ class TaskEdit(BaseModel):
     **Атрибути:**
     - title: Заголовок задачі (строка).
     - description: Опис задачі (строка).
-    - start_date: Дата початку задачі (строка).
-    - end_date: Дата закінчення задачі (строка).
-    - start_time: Час початку задачі (строка).
-    - end_time: Час закінчення задачі (строка).
+    - start_date: Дата початку задачі (дата YYYY-MM-DD).
+    - end_date: Дата закінчення задачі (дата YYYY-MM-DD).
+    - start_time: Час початку задачі (час HH:MM).
+    - end_time: Час закінчення задачі (час HH:MM).
     - repeat_days: Дні тижня, на які повторюється задача (список строк).
     - group: Назва групи, до якої належить задача (строка).
     - task_type: Тип задачі (строка).
@@ -242,10 +292,10 @@ class TaskEdit(BaseModel):
 
     title: str
     description: str
-    start_date: str
-    end_date: str
-    start_time: str
-    end_time: str
+    start_date: date
+    end_date: date
+    start_time: time
+    end_time: time
     repeat_days: List[str] = []
     group: str
     task_type: str
@@ -255,6 +305,14 @@ class TaskEdit(BaseModel):
     needphoto: int
     needcomment: int
 
+    @model_validator(mode="after")
+    def validate_schedule(self):
+        # Та сама перевірка, що й у Task
+        starts_at, ends_at = task_bounds(self.start_date, self.end_date, self.start_time, self.end_time)
+        if ends_at < starts_at:
+            raise ValueError("end_date/end_time must not be before start_date/start_time")
+        return self
+
 class TaskTime(BaseModel):
     """
     Модель для часу задачі: Використовується для відправки часу виконання задачі.
@@ -265,7 +323,7 @@ class TaskTime(BaseModel):
     - pause_start: Час початку паузи (список строк).
     - pause_end: Час закінчення паузи (список строк).
     - id_task: Ідентифікатор задачі (строка).
-    - keyTime: Унікальний ключ часу (строка).
+    - keyTime: Унікальний ключ часу (строка з датою та часом у форматі ISO, наприклад "2025-04-01T09:00").
     - comment: Коментар до задачі (необов'язково).
 
     **Приклад:**
@@ -290,14 +348,21 @@ class TaskTime(BaseModel):
     keyTime: str
     comment: Optional[str] # type: ignore
 
+    @field_validator("keyTime")
+    @classmethod
+    def validate_key_time(cls, value):
+        # Ключ зберігається як є, але має бути коректною датою/часом ISO
+        datetime.fromisoformat(value)
+        return value
+
 class TaskTimeCancel(BaseModel):
     """
     Модель для скасування часу задачі: Використовується для скасування часу задачі.
 
     **Атрибути:**
-    - cancel_time: Час скасування задачі (строка).
+    - cancel_time: Час скасування задачі (строка з датою та часом у форматі ISO).
     - id_task: Ідентифікатор задачі (строка).
-    - keyTime: Унікальний ключ часу (строка).
+    - keyTime: Унікальний ключ часу (строка з датою та часом у форматі ISO).
     - comment: Коментар до скасування (строка).
 
     **Приклад:**
@@ -315,3 +380,63 @@ class TaskTimeCancel(BaseModel):
     keyTime: str
     comment: str
 
+    @field_validator("cancel_time", "keyTime")
+    @classmethod
+    def validate_iso_datetime(cls, value):
+        datetime.fromisoformat(value)
+        return value
+
+class ProfilingConfig(BaseModel):
+    """
+    Модель для запуску профілювання: Використовується для налаштування частки запитів, що профілюються.
+
+    **Атрибути:**
+    - sample_rate: Частка запитів для профілювання від 0 до 1 (число, необов'язково).
+    - route_rates: Окремі частки від 0 до 1 для маршрутів у форматі "МЕТОД /шлях" (словник, необов'язково).
+
+    **Приклад:**
+    ```json
+    {
+        "sample_rate": 0.05,
+        "route_rates": {"GET /get_my_task": 0.5}
+    }
+    ```
+    """
+    sample_rate: Optional[float] = Field(None, ge=0, le=1)
+    route_rates: Optional[Dict[str, Annotated[float, Field(ge=0, le=1)]]] = None
+
+class CompletionBatch(BaseModel):
+    """
+    Модель для пакетного збереження виконань: Використовується клієнтами, що були офлайн.
+
+    Кожен елемент перевіряється окремо: елемент з полем `cancel_time` — як `TaskTimeCancel`,
+    інші — як `TaskTime`. Некоректні елементи не зупиняють збереження решти.
+
+    **Атрибути:**
+    - items: Список виконань або скасувань задач (від 1 до 500 елементів).
+
+    **Приклад:**
+    ```json
+    {
+        "items": [
+            {
+                "start_time": "09:00",
+                "finish_time": "10:00",
+                "pause_start": [],
+                "pause_end": [],
+                "id_task": "607d1f77bcf86cd799439012",
+                "keyTime": "2025-04-01T09:00",
+                "comment": null
+            },
+            {
+                "cancel_time": "2025-04-02T10:00",
+                "id_task": "607d1f77bcf86cd799439012",
+                "keyTime": "2025-04-02T09:00",
+                "comment": "Task cancelled"
+            }
+        ]
+    }
+    ```
+    """
+    items: List[Dict[str, Any]] = Field(..., min_length=1, max_length=500)
+
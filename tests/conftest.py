@@ -0,0 +1,11 @@
+import os
+import sys
+import tempfile
+
+# Modules are imported from the repository root, as uvicorn does with `main:app`
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Keep test runs out of logs/app.log
+os.environ.setdefault("LOG_FILE_PATH", os.path.join(tempfile.mkdtemp(), "app.log"))
+# Set before db.dbconn is imported (it does not override variables already set),
+# so tests never create indexes in or read the application database
+os.environ["MONGO_DB"] = os.getenv("TEST_MONGO_DB", "taskmanager_test")
@@ -0,0 +1,32 @@
+import asyncio
+
+import pytest
+from pymongo import MongoClient
+from pymongo.errors import PyMongoError
+
+from db import dbconn
+
+
+def _mongod_reachable():
+    # The same URI db.dbconn connects to, after it has loaded .env
+    try:
+        MongoClient(dbconn.mongo_uri, serverSelectionTimeoutMS=500).admin.command("ping")
+        return True
+    except PyMongoError:
+        return False
+
+
+pytestmark = [
+    pytest.mark.skipif(dbconn.users.name == dbconn.APP_DATABASE, reason="MONGO_DB points at the application database"),
+    pytest.mark.skipif(not _mongod_reachable(), reason="no mongod reachable at MONGO_URL"),
+]
+
+
+def test_no_route_query_does_a_collection_scan():
+    from db.indexes import ensure_indexes, collection_scans
+
+    async def scans():
+        await ensure_indexes()
+        return await collection_scans()
+
+    assert asyncio.run(scans()) == []
@@ -0,0 +1,40 @@
+from fastapi.testclient import TestClient
+
+import main
+
+
+def test_openapi_is_generated_once_and_rebuilt_for_new_routes(monkeypatch):
+    calls = []
+    real_get_openapi = main.get_openapi
+
+    def counting_get_openapi(**kwargs):
+        calls.append(kwargs)
+        return real_get_openapi(**kwargs)
+
+    monkeypatch.setattr(main, "get_openapi", counting_get_openapi)
+    monkeypatch.setitem(main._openapi_cache, "routes", None)
+    # Routes added by the test are dropped again when the list is restored
+    monkeypatch.setattr(main.app.router, "routes", list(main.app.router.routes))
+    client = TestClient(main.app)
+
+    first = client.get("/openapi.json")
+    second = client.get("/openapi.json")
+    assert first.status_code == second.status_code == 200
+    assert first.content == second.content
+    assert len(calls) == 1
+
+    etag = first.headers["etag"]
+    not_modified = client.get("/openapi.json", headers={"If-None-Match": etag})
+    assert not_modified.status_code == 304
+    assert not_modified.headers["etag"] == etag
+    assert len(calls) == 1
+
+    @main.app.get("/openapi-cache-test")
+    async def openapi_cache_test():
+        return {}
+
+    rebuilt = client.get("/openapi.json", headers={"If-None-Match": etag})
+    assert rebuilt.status_code == 200
+    assert "/openapi-cache-test" in rebuilt.json()["paths"]
+    assert rebuilt.headers["etag"] != etag
+    assert len(calls) == 2